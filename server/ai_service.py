@@ -1,27 +1,39 @@
-from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
 
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from crud import resource_crud, tag_crud
-from database import get_db
+from crud import resource_crud
+from database import SessionLocal
 from models import Resource
-from utils.ai_client import create_chat_model
+from utils.ai_client import create_chat_model, get_effective_ai_settings
+
+logger = logging.getLogger(__name__)
 
 
-class TagSelectionOutput(BaseModel):
-    """AI标签选择输出模型"""
+class SearchSelectionOutput(BaseModel):
+    """AI搜索选择输出模型（标签 + 资源一次性选择）"""
 
     selected_tags: List[str] = Field(description="选择的相关标签列表")
+    selected_resource_ids: List[int] = Field(description="选择的资源ID列表")
 
 
-class ResourceSelectionOutput(BaseModel):
-    """AI资源选择输出模型"""
+class BatchedSearchSelectionOutput(BaseModel):
+    """AI批量搜索选择输出模型（按问题编号顺序返回）"""
 
-    selected_resource_ids: List[int] = Field(description="选择的资源ID列表")
+    results: List[SearchSelectionOutput] = Field(
+        description="按Q1、Q2...编号顺序排列的每个问题的选择结果"
+    )
 
 
 def resource_search_workflow(
@@ -34,11 +46,12 @@ def resource_search_workflow(
     资源搜索工作流
 
     工作流步骤：
-    1. 获取用户所有标签
-    2. AI分析用户意图，选出相关标签
-    3. 获取这些标签下所有资源的标题和ID
-    4. AI从资源列表中选出匹配的资源ID
-    5. 根据ID查询完整资源信息
+    1. 一次JOIN查询获取用户所有标签及其资源（ID + 标题）
+    2. AI单次调用同时选出相关标签和匹配的资源ID
+    3. 根据ID从缓存中取出完整资源信息
+
+    相比旧版"先选标签、再选资源"的两次LLM往返，
+    合并为单次调用可将端到端延迟和token开销减半。
 
     Args:
         user_query: 用户查询内容
@@ -50,129 +63,169 @@ def resource_search_workflow(
         匹配的资源对象列表
     """
     try:
-        # 步骤1：获取用户所有标签
+        # 步骤1：一次查询获取用户所有标签及其资源
         if progress_callback:
             progress_callback("🔍 正在分析您的搜索需求...")
 
-        print(f"[步骤1] 获取用户 {user_id} 的所有标签...")
-        user_tags = tag_crud.get_user_tags(db, user_id)
+        logger.debug("[步骤1] 获取用户 %s 的标签及资源...", user_id)
+        tagged_resources = resource_crud.get_tagged_resources_by_user(db, user_id)
 
-        if not user_tags:
+        if not tagged_resources:
             if progress_callback:
                 progress_callback(
                     "⚠️ 您还没有收藏任何资源，请先添加一些资源到您的收藏夹"
                 )
-            print("用户暂无任何标签")
+            logger.debug("用户暂无任何标签")
             return []
 
-        tag_names = [tag.name for tag in user_tags]
-        print(f"用户标签: {tag_names}")
+        # 按标签分组资源，并缓存完整资源对象供步骤3使用
+        resources_by_tag: Dict[str, List[Resource]] = {}
+        resource_cache: Dict[int, Resource] = {}
+
+        for tag_name, resource in tagged_resources:
+            resources_by_tag.setdefault(tag_name, []).append(resource)
+            resource_cache[resource.id] = resource
 
-        # 步骤2：AI分析用户意图，选出相关标签
+        tag_names = list(resources_by_tag.keys())
+        logger.debug("用户标签: %s，候选资源数量: %d", tag_names, len(resource_cache))
+
+        # 步骤2：AI单次调用同时选出相关标签和匹配资源
         if progress_callback:
-            progress_callback("🤖 AI正在分析您的搜索意图...")
+            progress_callback("🤖 AI正在分析您的搜索意图并筛选资源...")
 
-        print(f"[步骤2] AI分析用户意图: '{user_query}'")
-        selected_tags = _select_relevant_tags(user_query, tag_names)
-        print(f"AI选择的相关标签: {selected_tags}")
+        logger.debug("[步骤2] AI分析用户意图并选择资源: '%s'", user_query)
+        selected_tags, selected_resource_ids = _select_tags_and_resources(
+            db, user_id, user_query, resources_by_tag
+        )
+        logger.debug("AI选择的相关标签: %s", selected_tags)
+        logger.debug("AI选择的资源ID: %s", selected_resource_ids)
 
-        if not selected_tags:
+        if not selected_resource_ids:
             if progress_callback:
-                progress_callback(
-                    "⚠️ 未找到与您的搜索相关的标签，请尝试使用不同的关键词"
-                )
-            print("AI未找到相关标签")
+                progress_callback("⚠️ AI未找到与您的需求匹配的资源")
+            logger.debug("AI未找到匹配的资源")
             return []
 
         if progress_callback:
-            progress_callback(f"🏷️ 找到相关标签：{', '.join(selected_tags)}")
+            if selected_tags:
+                progress_callback(f"🏷️ 找到相关标签：{', '.join(selected_tags)}")
+            progress_callback(
+                f"✨ AI选出了 {len(selected_resource_ids)} 个最匹配的资源"
+            )
 
-        # 步骤3：获取选中标签下的所有资源标题和ID
-        if progress_callback:
-            progress_callback("📚 正在搜索相关资源...")
+        # 步骤3：根据ID从缓存中取出完整资源信息
+        logger.debug("[步骤3] 从缓存中获取完整资源信息")
+        final_results = []
+
+        for resource_id in selected_resource_ids:
+            # 直接从缓存中获取资源对象，避免重复查询数据库
+            if resource_id in resource_cache:
+                final_results.append(resource_cache[resource_id])
+            else:
+                # 如果缓存中没有（理论上不应该发生），则查询数据库
+                logger.warning("资源ID %s 不在缓存中，执行数据库查询", resource_id)
+                resource = resource_crud.get_resource_by_id(db, resource_id, user_id)
+                if resource:
+                    final_results.append(resource)
 
-        print(f"[步骤3] 获取标签下的资源...")
-        resource_candidates = []
-        resource_cache = {}  # 缓存资源对象，避免步骤5重复查询
+        logger.debug("工作流完成，返回 %d 个匹配资源", len(final_results))
 
-        for tag_name in selected_tags:
-            # 获取该标签下的资源
-            try:
-                resources_data, total_count = resource_crud.get_resources_by_tag(
-                    db,
-                    user_id,
-                    tag_name,
-                    page=1,
-                    size=100,  # 获取足够多的资源
-                )
+        if progress_callback and final_results:
+            progress_callback(
+                f"✅ 搜索完成！为您找到了 {len(final_results)} 个匹配的资源"
+            )
 
-                if resources_data is None:
-                    print(f"警告：标签 '{tag_name}' 返回了None结果")
-                    continue
+        return final_results
 
-                print(f"标签 '{tag_name}' 下找到 {len(resources_data)} 个资源")
+    except Exception as e:
+        logger.error("工作流执行失败: %s", e)
+        return []
 
-            except Exception as e:
-                print(f"获取标签 '{tag_name}' 下的资源失败: {str(e)}")
-                continue
 
-            for item in resources_data:
-                resource = item["resource"]
-                # 避免重复资源
-                if not any(r["id"] == resource.id for r in resource_candidates):
-                    resource_candidates.append(
-                        {"id": resource.id, "title": resource.title}
-                    )
-                    # 缓存完整的资源对象
-                    resource_cache[resource.id] = resource
+def _load_tagged_resources(user_id: int) -> List[Tuple[str, Resource]]:
+    """在工作线程中加载用户候选集
+
+    Session 不是线程安全的，不能把请求作用域的会话带进
+    asyncio.to_thread，这里用独立的短会话；后续只读已加载的
+    id/标题列，会话关闭后对象仍可读。
+    """
+    with SessionLocal() as task_db:
+        return resource_crud.get_tagged_resources_by_user(task_db, user_id)
 
-        print(f"候选资源数量: {len(resource_candidates)}")
 
-        if not resource_candidates:
+async def resource_search_workflow_async(
+    user_query: str,
+    user_id: int,
+    db: Session,
+    progress_callback: Optional[Callable[[str], None]] = None,
+) -> List[Resource]:
+    """
+    资源搜索工作流（异步版本）
+
+    步骤与同步版一致，但阻塞的数据库查询通过 asyncio.to_thread
+    移出事件循环（工作线程内使用独立短会话），LLM调用走批量
+    调度器的异步路径，使多个并发搜索的DB和LLM延迟互相重叠而非排队。
+
+    Args:
+        user_query: 用户查询内容
+        user_id: 用户ID
+        db: 数据库会话
+        progress_callback: 进度回调函数
+
+    Returns:
+        匹配的资源对象列表
+    """
+    try:
+        if progress_callback:
+            progress_callback("🔍 正在分析您的搜索需求...")
+
+        logger.debug("[步骤1] 获取用户 %s 的标签及资源...", user_id)
+        tagged_resources = await asyncio.to_thread(_load_tagged_resources, user_id)
+
+        if not tagged_resources:
             if progress_callback:
-                progress_callback("⚠️ 在相关标签下未找到任何资源")
-            print("所选标签下无资源")
+                progress_callback(
+                    "⚠️ 您还没有收藏任何资源，请先添加一些资源到您的收藏夹"
+                )
+            logger.debug("用户暂无任何标签")
             return []
 
+        resources_by_tag: Dict[str, List[Resource]] = {}
+        resource_cache: Dict[int, Resource] = {}
+
+        for tag_name, resource in tagged_resources:
+            resources_by_tag.setdefault(tag_name, []).append(resource)
+            resource_cache[resource.id] = resource
+
         if progress_callback:
-            progress_callback(
-                f"📊 找到 {len(resource_candidates)} 个候选资源，AI正在筛选最匹配的资源..."
-            )
+            progress_callback("🤖 AI正在分析您的搜索意图并筛选资源...")
 
-        # 步骤4：AI从资源列表中选出匹配的资源ID
-        print(f"[步骤4] AI从 {len(resource_candidates)} 个候选资源中选择匹配项")
-        selected_resource_ids = _select_matching_resources(
-            user_query, resource_candidates
+        logger.debug("[步骤2] AI分析用户意图并选择资源: '%s'", user_query)
+        selected_tags, selected_resource_ids = await search_selection_dispatcher.submit(
+            db, user_id, user_query, resources_by_tag
         )
-        print(f"AI选择的资源ID: {selected_resource_ids}")
+        logger.debug("AI选择的相关标签: %s", selected_tags)
+        logger.debug("AI选择的资源ID: %s", selected_resource_ids)
 
         if not selected_resource_ids:
             if progress_callback:
                 progress_callback("⚠️ AI未找到与您的需求匹配的资源")
-            print("AI未找到匹配的资源")
             return []
 
         if progress_callback:
+            if selected_tags:
+                progress_callback(f"🏷️ 找到相关标签：{', '.join(selected_tags)}")
             progress_callback(
                 f"✨ AI选出了 {len(selected_resource_ids)} 个最匹配的资源"
             )
 
-        # 步骤5：根据ID查询完整资源信息（使用缓存）
-        print(f"[步骤5] 从缓存中获取完整资源信息")
-        final_results = []
-
-        for resource_id in selected_resource_ids:
-            # 直接从缓存中获取资源对象，避免重复查询数据库
-            if resource_id in resource_cache:
-                final_results.append(resource_cache[resource_id])
-            else:
-                # 如果缓存中没有（理论上不应该发生），则查询数据库
-                print(f"警告：资源ID {resource_id} 不在缓存中，执行数据库查询")
-                resource = resource_crud.get_resource_by_id(db, resource_id, user_id)
-                if resource:
-                    final_results.append(resource)
+        final_results = [
+            resource_cache[resource_id]
+            for resource_id in selected_resource_ids
+            if resource_id in resource_cache
+        ]
 
-        print(f"工作流完成，返回 {len(final_results)} 个匹配资源")
+        logger.debug("工作流完成，返回 %d 个匹配资源", len(final_results))
 
         if progress_callback and final_results:
             progress_callback(
@@ -182,156 +235,692 @@ def resource_search_workflow(
         return final_results
 
     except Exception as e:
-        print(f"工作流执行失败: {str(e)}")
+        logger.error("工作流执行失败: %s", e)
         return []
 
 
-def _select_relevant_tags(user_query: str, available_tags: List[str]) -> List[str]:
+def resource_search_workflow_batch(
+    queries: List[Tuple[str, int]],
+    db: Session,
+) -> List[List[Resource]]:
     """
-    AI选择与用户查询相关的标签
+    批量资源搜索工作流
+
+    按用户分组后，同一用户的多个查询共享一次候选集查询，
+    并通过 chain.batch 并发调用LLM，避免逐个排队。
+
+    Args:
+        queries: (用户查询, 用户ID) 元组列表
+        db: 数据库会话
+
+    Returns:
+        与输入顺序对应的匹配资源列表
     """
-    if not available_tags:
-        return []
+    # 按用户分组，记录每个查询在输入中的位置
+    queries_by_user: Dict[int, List[Tuple[int, str]]] = {}
+    for index, (user_query, user_id) in enumerate(queries):
+        queries_by_user.setdefault(user_id, []).append((index, user_query))
+
+    results: List[List[Resource]] = [[] for _ in queries]
+
+    for user_id, indexed_queries in queries_by_user.items():
+        tagged_resources = resource_crud.get_tagged_resources_by_user(db, user_id)
+        if not tagged_resources:
+            continue
+
+        resources_by_tag: Dict[str, List[Resource]] = {}
+        resource_cache: Dict[int, Resource] = {}
+        for tag_name, resource in tagged_resources:
+            resources_by_tag.setdefault(tag_name, []).append(resource)
+            resource_cache[resource.id] = resource
+
+        selections = _select_tags_and_resources_batch(
+            db,
+            user_id,
+            [user_query for _, user_query in indexed_queries],
+            resources_by_tag,
+        )
 
-    # 设置JSON输出解析器（使用Pydantic模型）
-    parser = JsonOutputParser(pydantic_object=TagSelectionOutput)
-
-    # 创建提示模板（使用partial_variables设置format_instructions）
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                """用户有一个链接资源收藏夹，每个资源有多个标签，用户会告诉你他想要什么样的资源，你需要从给定的标签列表中选择几个最相关的标签。
-                <选择原则>
-                1. 选择与用户需求直接相关的标签
-                2. 最多选择3-5个标签（避免结果过多）
-                3. 如果用户需求模糊，选择最可能匹配的标签
-                4. 如果没有相关标签，返回空列表
-                </选择原则>
-                {format_instructions}""",
-            ),
-            (
-                "human",
-                "<用户输入>{user_query}</用户输入>\n<可用标签>{available_tags}</可用标签>\n，请选择相关标签。",
-            ),
-        ]
-    ).partial(format_instructions=parser.get_format_instructions())
+        for (index, _), (_, selected_resource_ids) in zip(
+            indexed_queries, selections
+        ):
+            results[index] = [
+                resource_cache[resource_id]
+                for resource_id in selected_resource_ids
+                if resource_id in resource_cache
+            ]
 
-    # 构建链
-    chain = prompt | create_chat_model(db, user_id, streaming=False) | parser
+    return results
 
-    try:
-        result = chain.invoke(
-            {
-                "user_query": user_query,
-                "available_tags": available_tags,
-            }
+
+def _format_resources_by_tag(resources_by_tag: Dict[str, List[Resource]]) -> str:
+    """将按标签分组的资源压缩为提示词文本
+
+    每行压缩为 `资源ID|标题`（标题截断到80字符），
+    省掉逐行重复的中文字段标签，显著减少prefill token。
+    """
+    sections = []
+    for tag_name, resources in resources_by_tag.items():
+        lines = "\n".join(
+            [f"{resource.id}|{resource.title[:80]}" for resource in resources]
         )
+        sections.append(f"[{tag_name}]\n{lines}")
+    return "\n".join(sections)
 
-        print(f"AI返回结果类型: {type(result)}, 值: {result}")
 
-        # 处理不同类型的返回结果
-        if isinstance(result, dict):
-            selected_tags = result.get("selected_tags", [])
-        elif hasattr(result, "selected_tags"):
-            selected_tags = result.selected_tags
-        else:
-            print(f"意外的结果类型: {type(result)}, 值: {result}")
-            selected_tags = []
+# 选择结果缓存：相同(查询, 候选集)的LLM选择是确定性的，直接复用
+# 缓存键包含标签名和资源ID指纹，标签/资源变动后键自然失效，无需显式清理
+_selection_cache: TTLCache = TTLCache(maxsize=5000, ttl=300)
+_selection_cache_lock = threading.Lock()
 
-        print(f"AI选择的标签（原始）: {selected_tags}")
 
-        # 验证选择的标签是否在可用标签中
-        valid_tags = [tag for tag in selected_tags if tag in available_tags]
-        return valid_tags
+def _selection_cache_key(
+    user_query: str, resources_by_tag: Dict[str, List[Resource]]
+) -> str:
+    """计算 (用户查询, 候选集指纹) 的缓存键"""
+    parts = [user_query]
+    for tag_name in sorted(resources_by_tag):
+        resource_ids = ",".join(
+            str(resource.id) for resource in resources_by_tag[tag_name]
+        )
+        parts.append(f"{tag_name}:{resource_ids}")
+    raw = "|".join(parts).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+# 语义预筛：标题向量缓存（跨查询复用；标题变更后缓存键自然失效）
+_title_embedding_cache: TTLCache = TTLCache(maxsize=20_000, ttl=3600)
+_title_embedding_cache_lock = threading.Lock()
+
+_EMBED_SHORTLIST_THRESHOLD = 50  # 候选数超过该值才启用语义预筛
+_EMBED_SHORTLIST_TOP_K = 20  # 预筛后送入LLM的候选数
+_SELECTION_TOP_K = 5  # 候选数不超过该值时跳过LLM精选直接全选
+_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def _build_embeddings_client(db: Session, user_id: int):
+    """根据用户当前生效的AI配置创建embedding客户端"""
+    from langchain_openai import OpenAIEmbeddings
+
+    config = get_effective_ai_settings(db, user_id)
+    return OpenAIEmbeddings(
+        base_url=config.ai_base_url,
+        api_key=config.ai_api_key,
+        model=_EMBEDDING_MODEL,
+        check_embedding_ctx_length=False,
+    )
+
+
+def _normalize_vector(vector: List[float]) -> List[float]:
+    """归一化向量，使余弦相似度退化为点积"""
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def _embed_titles(embeddings_client, titles: List[str]) -> List[List[float]]:
+    """批量获取标题向量（带缓存），返回归一化后的向量列表"""
+    keys = [
+        hashlib.blake2b(title.encode("utf-8"), digest_size=16).hexdigest()
+        for title in titles
+    ]
+
+    with _title_embedding_cache_lock:
+        cached = {key: _title_embedding_cache.get(key) for key in keys}
+
+    missing_indices = [i for i, key in enumerate(keys) if cached[key] is None]
+    if missing_indices:
+        raw_vectors = embeddings_client.embed_documents(
+            [titles[i] for i in missing_indices]
+        )
+        with _title_embedding_cache_lock:
+            for index, raw_vector in zip(missing_indices, raw_vectors):
+                vector = _normalize_vector(raw_vector)
+                cached[keys[index]] = vector
+                _title_embedding_cache[keys[index]] = vector
+
+    return [cached[key] for key in keys]
+
+
+def _shortlist_resources_by_tag(
+    db: Session,
+    user_id: int,
+    user_query: str,
+    resources_by_tag: Dict[str, List[Resource]],
+) -> Dict[str, List[Resource]]:
+    """语义预筛：候选过多时先用廉价embedding按相似度截取top-K
+
+    reranker式两级架构——稠密检索先把候选缩到top-K短名单，
+    昂贵的LLM只对短名单做精选，prompt token不再随收藏量线性增长。
+    预筛失败（如端点不支持embedding）时退回完整候选集。
+    """
+    total = sum(len(resources) for resources in resources_by_tag.values())
+    if total <= _EMBED_SHORTLIST_THRESHOLD:
+        return resources_by_tag
+
+    try:
+        unique_resources: Dict[int, Resource] = {}
+        for resources in resources_by_tag.values():
+            for resource in resources:
+                unique_resources.setdefault(resource.id, resource)
+        candidates = list(unique_resources.values())
+
+        embeddings_client = _build_embeddings_client(db, user_id)
+        query_vector = _normalize_vector(embeddings_client.embed_query(user_query))
+        title_vectors = _embed_titles(
+            embeddings_client, [resource.title for resource in candidates]
+        )
+
+        scores = {
+            resource.id: sum(
+                q_value * t_value
+                for q_value, t_value in zip(query_vector, title_vector)
+            )
+            for resource, title_vector in zip(candidates, title_vectors)
+        }
+        top_ids = set(
+            sorted(scores, key=scores.get, reverse=True)[:_EMBED_SHORTLIST_TOP_K]
+        )
+
+        shortlisted: Dict[str, List[Resource]] = {}
+        for tag_name, resources in resources_by_tag.items():
+            kept = [resource for resource in resources if resource.id in top_ids]
+            if kept:
+                shortlisted[tag_name] = kept
+
+        logger.debug("[语义预筛] 候选 %d -> %d", total, len(top_ids))
+        return shortlisted or resources_by_tag
 
     except Exception as e:
-        print(f"标签选择失败: {str(e)}")
-        # 兜底策略：简单关键词匹配
-        user_query_lower = user_query.lower()
-        fallback_tags = []
-        for tag in available_tags:
-            if any(keyword in tag.lower() for keyword in user_query_lower.split()):
-                fallback_tags.append(tag)
-        return fallback_tags[:3]  # 最多返回3个
-
-
-def _select_matching_resources(
-    user_query: str, resource_candidates: List[Dict]
-) -> List[int]:
+        logger.warning("语义预筛失败，使用完整候选集: %s", e)
+        return resources_by_tag
+
+
+# 提示模板、解析器与format_instructions都是纯数据，在模块加载时构建一次，
+# 避免每次搜索在请求路径上重复分配和字符串拼接
+_selection_parser = JsonOutputParser(pydantic_object=SearchSelectionOutput)
+
+_selection_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """用户有一个链接资源收藏夹，每个资源有多个标签，用户会告诉你他想要什么样的资源，你需要从给定的标签和资源列表中同时选出最相关的标签和最匹配的资源。
+            <选择原则>
+            1. 先判断哪些标签与用户需求直接相关（最多3-5个），再从这些标签下的资源中选出匹配的资源
+            2. 资源标题要与用户需求相关，优先选择更具体、更准确匹配的资源
+            3. 如果用户需求模糊，选择最可能匹配的标签和资源
+            4. 如果没有相关标签或资源，对应字段返回空列表
+            </选择原则>
+            {format_instructions}""",
+        ),
+        (
+            "human",
+            "<用户输入>{user_query}</用户输入>\n<可用标签>{available_tags}</可用标签>\n<候选资源按标签分组>（每行格式：资源ID|标题）\n{grouped_resources_text}\n</候选资源按标签分组>\n请同时选出相关标签和最匹配的资源ID。",
+        ),
+    ]
+).partial(format_instructions=_selection_parser.get_format_instructions())
+
+_batched_selection_parser = JsonOutputParser(
+    pydantic_object=BatchedSearchSelectionOutput
+)
+
+_batched_selection_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """用户有一个链接资源收藏夹，每个资源有多个标签。下面会给出多个相互独立的搜索问题（按Q1、Q2...编号），你需要为每个问题分别从给定的标签和资源列表中选出最相关的标签和最匹配的资源。
+            <选择原则>
+            1. 每个问题独立处理，互不影响
+            2. 先判断哪些标签与该问题直接相关（最多3-5个），再从这些标签下的资源中选出匹配的资源
+            3. 如果某个问题没有相关标签或资源，对应字段返回空列表
+            4. results数组必须与问题编号一一对应且数量相同
+            </选择原则>
+            {format_instructions}""",
+        ),
+        (
+            "human",
+            "<用户问题列表>\n{queries_text}\n</用户问题列表>\n<可用标签>{available_tags}</可用标签>\n<候选资源按标签分组>（每行格式：资源ID|标题）\n{grouped_resources_text}\n</候选资源按标签分组>\n请按编号顺序为每个问题选出相关标签和最匹配的资源ID。",
+        ),
+    ]
+).partial(format_instructions=_batched_selection_parser.get_format_instructions())
+
+
+def _build_selection_prompt():
+    """获取"标签 + 资源一次性选择"的提示模板和解析器（模块级单例）"""
+    return _selection_prompt, _selection_parser
+
+
+def _build_selection_chain(db: Session, user_id: int):
+    """构建"标签 + 资源一次性选择"的LLM链
+
+    提示模板与解析器复用模块级单例，只有LLM客户端随用户配置变化。
     """
-    AI从候选资源中选择最匹配用户需求的资源
+    return _selection_prompt | create_chat_model(db, user_id, streaming=False) | _selection_parser
+
+
+def _stream_json_until_complete(llm, messages) -> str:
+    """流式读取LLM输出，JSON根对象闭合后立即断流
+
+    候选列表很长时，模型可能在JSON之后继续输出解释性文字；
+    用括号深度计数在根对象闭合的瞬间关闭流，省掉尾部token。
     """
-    if not resource_candidates:
-        return []
+    pieces: List[str] = []
+    depth = 0
+    started = False
+    in_string = False
+    escaped = False
+
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            content = chunk.content or ""
+            if not content:
+                continue
+
+            for position, char in enumerate(content):
+                if escaped:
+                    escaped = False
+                    continue
+                if in_string:
+                    if char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                    continue
+                if char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                    started = True
+                elif char == "}":
+                    depth -= 1
+                    if started and depth == 0:
+                        # 根对象已闭合，截断当前块并停止读取
+                        pieces.append(content[: position + 1])
+                        return "".join(pieces)
+
+            pieces.append(content)
+    finally:
+        stream.close()
+
+    return "".join(pieces)
+
+
+def _parse_selection_result(result) -> Tuple[List[str], List[int]]:
+    """解析LLM返回的选择结果（dict或Pydantic模型均可）"""
+    if isinstance(result, dict):
+        return (
+            result.get("selected_tags", []),
+            result.get("selected_resource_ids", []),
+        )
+    if hasattr(result, "selected_tags"):
+        return result.selected_tags, result.selected_resource_ids
+
+    logger.warning("意外的结果类型: %s, 值: %s", type(result), result)
+    return [], []
 
-    # 创建资源列表字符串
-    resources_text = "\n".join(
-        [f"ID: {r['id']}, 标题: {r['title']}" for r in resource_candidates]
+
+def _select_tags_and_resources(
+    db: Session,
+    user_id: int,
+    user_query: str,
+    resources_by_tag: Dict[str, List[Resource]],
+) -> Tuple[List[str], List[int]]:
+    """
+    AI单次调用：同时选择相关标签和匹配的资源ID
+    """
+    if not resources_by_tag:
+        return [], []
+
+    # 候选数不超过精选上限时，"最多选几个"必然是全选，省掉一次LLM往返
+    candidate_total = sum(len(resources) for resources in resources_by_tag.values())
+    if candidate_total <= _SELECTION_TOP_K:
+        logger.debug("候选仅 %d 个，跳过AI精选直接全选", candidate_total)
+        all_ids: List[int] = []
+        seen_ids = set()
+        for resources in resources_by_tag.values():
+            for resource in resources:
+                if resource.id not in seen_ids:
+                    seen_ids.add(resource.id)
+                    all_ids.append(resource.id)
+        return list(resources_by_tag.keys()), all_ids
+
+    cache_key = _selection_cache_key(user_query, resources_by_tag)
+    with _selection_cache_lock:
+        cached = _selection_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("[选择缓存] 命中: '%s'", user_query)
+        cached_tags, cached_ids = cached
+        return list(cached_tags), list(cached_ids)
+
+    # 候选过多时先做语义预筛，LLM只精选短名单
+    resources_by_tag = _shortlist_resources_by_tag(
+        db, user_id, user_query, resources_by_tag
     )
 
-    # 设置JSON输出解析器（使用Pydantic模型）
-    parser = JsonOutputParser(pydantic_object=ResourceSelectionOutput)
-
-    # 创建提示模板（使用partial_variables设置format_instructions）
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                """你是一个智能资源选择助手，用户有一个链接资源收藏夹，现在用户想要找某个或者某些资源，你需要从候选资源列表中选择最匹配的资源。
-                    <选择原则>
-                    1. 资源标题要与用户需求相关
-                    2. 优先选择更具体、更准确匹配的资源
-                    3. 如果没有相关资源，返回空列表
-                    </选择原则>
-                    {format_instructions}""",
-            ),
-            (
-                "human",
-                "<用户输入>{user_query}</用户输入>\n<候选资源>{resources_text}</候选资源>\n请选择最匹配的资源ID：",
-            ),
-        ]
-    ).partial(format_instructions=parser.get_format_instructions())
+    prompt, parser = _build_selection_prompt()
 
-    # 构建链
-    chain = prompt | create_chat_model(db, user_id, streaming=False) | parser
+    try:
+        messages = prompt.format_messages(
+            user_query=user_query,
+            available_tags=list(resources_by_tag.keys()),
+            grouped_resources_text=_format_resources_by_tag(resources_by_tag),
+        )
+        # 流式读取并在JSON闭合时断流，避免等待尾部冗余token
+        llm = create_chat_model(db, user_id, streaming=True)
+        raw_output = _stream_json_until_complete(llm, messages)
+        result = parser.parse(raw_output)
+
+        logger.debug("AI返回结果类型: %s, 值: %s", type(result), result)
+
+        selected_tags, selected_ids = _parse_selection_result(result)
+        valid_tags, valid_ids = _validate_selection(
+            selected_tags, selected_ids, resources_by_tag
+        )
+
+        # 只缓存成功的LLM结果，失败走兜底不缓存
+        with _selection_cache_lock:
+            _selection_cache[cache_key] = (list(valid_tags), list(valid_ids))
+
+        return valid_tags, valid_ids
+
+    except Exception as e:
+        logger.warning("标签与资源选择失败: %s", e)
+        return _keyword_fallback(user_query, resources_by_tag)
+
+
+def _select_tags_and_resources_batch(
+    db: Session,
+    user_id: int,
+    user_queries: List[str],
+    resources_by_tag: Dict[str, List[Resource]],
+) -> List[Tuple[List[str], List[int]]]:
+    """
+    AI批量选择：通过 chain.batch 并发处理同一用户的多个查询
+
+    LangChain 的 batch 会复用连接池并发发起HTTP请求，
+    避免多个查询在 _select_tags_and_resources 上排队。
+    """
+    if not resources_by_tag or not user_queries:
+        return [([], []) for _ in user_queries]
+
+    chain = _build_selection_chain(db, user_id)
+    available_tags = list(resources_by_tag.keys())
+    grouped_resources_text = _format_resources_by_tag(resources_by_tag)
+
+    inputs = [
+        {
+            "user_query": user_query,
+            "available_tags": available_tags,
+            "grouped_resources_text": grouped_resources_text,
+        }
+        for user_query in user_queries
+    ]
 
     try:
-        result = chain.invoke(
+        results = chain.batch(inputs, config={"max_concurrency": 16})
+    except Exception as e:
+        logger.warning("批量标签与资源选择失败: %s", e)
+        return [
+            _keyword_fallback(user_query, resources_by_tag)
+            for user_query in user_queries
+        ]
+
+    parsed = []
+    for user_query, result in zip(user_queries, results):
+        selected_tags, selected_ids = _parse_selection_result(result)
+        parsed.append(
+            _validate_selection(selected_tags, selected_ids, resources_by_tag)
+        )
+    return parsed
+
+
+def _validate_selection(
+    selected_tags: List[str],
+    selected_ids: List[int],
+    resources_by_tag: Dict[str, List[Resource]],
+) -> Tuple[List[str], List[int]]:
+    """验证AI返回的标签和资源ID确实存在于候选集合中"""
+    valid_tags = [tag for tag in selected_tags if tag in resources_by_tag]
+
+    candidate_ids = {
+        resource.id
+        for resources in resources_by_tag.values()
+        for resource in resources
+    }
+    valid_ids = [
+        resource_id for resource_id in selected_ids if resource_id in candidate_ids
+    ]
+
+    return valid_tags, valid_ids
+
+
+def _build_keyword_matcher(user_query: str) -> Optional[Callable[[str], bool]]:
+    """把查询关键词编译成单次扫描的匹配函数
+
+    多关键词时用一个编译好的正则交替式代替逐关键词的 `in` 扫描，
+    每个候选字符串只需遍历一次；单关键词直接用 `in`。
+    """
+    keywords = user_query.lower().split()
+    if not keywords:
+        return None
+
+    if len(keywords) == 1:
+        keyword = keywords[0]
+        return lambda text: keyword in text
+
+    pattern = re.compile("|".join(map(re.escape, keywords)))
+    return lambda text: pattern.search(text) is not None
+
+
+def _keyword_fallback(
+    user_query: str, resources_by_tag: Dict[str, List[Resource]]
+) -> Tuple[List[str], List[int]]:
+    """兜底策略：LLM调用失败时基于关键词简单匹配"""
+    matches = _build_keyword_matcher(user_query)
+    if matches is None:
+        return [], []
+
+    fallback_tags = [tag for tag in resources_by_tag if matches(tag.lower())][
+        :3
+    ]  # 最多返回3个
+
+    fallback_ids = []
+    seen_ids = set()
+    for resources in resources_by_tag.values():
+        for resource in resources:
+            if resource.id not in seen_ids and matches(resource.title.lower()):
+                seen_ids.add(resource.id)
+                fallback_ids.append(resource.id)
+
+    return fallback_tags, fallback_ids
+
+
+class _PendingSelection:
+    """批量调度器中等待处理的单个搜索请求"""
+
+    def __init__(
+        self,
+        db: Session,
+        user_id: int,
+        user_query: str,
+        resources_by_tag: Dict[str, List[Resource]],
+        future: "asyncio.Future[Tuple[List[str], List[int]]]",
+    ):
+        self.db = db
+        self.user_id = user_id
+        self.user_query = user_query
+        self.resources_by_tag = resources_by_tag
+        self.future = future
+
+
+class BatchedSearchDispatcher:
+    """
+    搜索请求批量调度器
+
+    将短时间窗口内到达的多个并发搜索请求合并为一次LLM调用：
+    多个问题共享同一份系统提示词（prefill成本按批次摊销），
+    提示词中以 Q1、Q2... 编号区分，模型按编号顺序返回结果数组。
+
+    使用方式：
+        dispatcher = BatchedSearchDispatcher()
+        tags, ids = await dispatcher.submit(db, user_id, query, resources_by_tag)
+    """
+
+    def __init__(self, window_seconds: float = 0.05, max_batch_size: int = 8):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[int, List[_PendingSelection]] = {}  # 按用户分组
+        self._flush_tasks: Dict[int, "asyncio.Task"] = {}
+        self._lock = asyncio.Lock()
+
+    async def submit(
+        self,
+        db: Session,
+        user_id: int,
+        user_query: str,
+        resources_by_tag: Dict[str, List[Resource]],
+    ) -> Tuple[List[str], List[int]]:
+        """提交一个搜索请求，等待所在批次完成后返回结果"""
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Tuple[List[str], List[int]]]" = loop.create_future()
+        entry = _PendingSelection(db, user_id, user_query, resources_by_tag, future)
+
+        async with self._lock:
+            bucket = self._pending.setdefault(user_id, [])
+            bucket.append(entry)
+
+            if len(bucket) >= self.max_batch_size:
+                # 批次已满，立即触发
+                self._pending.pop(user_id, None)
+                flush_task = self._flush_tasks.pop(user_id, None)
+                if flush_task:
+                    flush_task.cancel()
+                asyncio.ensure_future(self._process_batch(bucket))
+            elif user_id not in self._flush_tasks:
+                # 批次内第一个请求，启动窗口计时
+                self._flush_tasks[user_id] = asyncio.ensure_future(
+                    self._flush_after_window(user_id)
+                )
+
+        return await future
+
+    async def _flush_after_window(self, user_id: int) -> None:
+        """等待收集窗口结束后处理该用户的批次"""
+        try:
+            await asyncio.sleep(self.window_seconds)
+        except asyncio.CancelledError:
+            return
+
+        async with self._lock:
+            bucket = self._pending.pop(user_id, [])
+            self._flush_tasks.pop(user_id, None)
+
+        if bucket:
+            await self._process_batch(bucket)
+
+    async def _process_batch(self, batch: List[_PendingSelection]) -> None:
+        """处理一个批次：单个请求走普通路径，多个请求合并为一次LLM调用"""
+        if len(batch) == 1:
+            entry = batch[0]
+
+            def _select_in_thread():
+                # Session 不是线程安全的，工作线程用独立短会话，
+                # 不复用请求作用域的 entry.db
+                with SessionLocal() as task_db:
+                    return _select_tags_and_resources(
+                        task_db,
+                        entry.user_id,
+                        entry.user_query,
+                        entry.resources_by_tag,
+                    )
+
+            try:
+                result = await asyncio.to_thread(_select_in_thread)
+                entry.future.set_result(result)
+            except Exception as e:
+                entry.future.set_exception(e)
+            return
+
+        logger.debug("[批量调度] 合并 %d 个搜索请求为一次LLM调用", len(batch))
+
+        # 同一用户的候选集合并（通常各请求完全一致）
+        merged_resources_by_tag: Dict[str, List[Resource]] = {}
+        seen_ids: set = set()
+        for entry in batch:
+            for tag_name, resources in entry.resources_by_tag.items():
+                bucket = merged_resources_by_tag.setdefault(tag_name, [])
+                for resource in resources:
+                    if resource.id not in seen_ids:
+                        seen_ids.add(resource.id)
+                        bucket.append(resource)
+
+        try:
+            results = await self._invoke_batched(
+                batch[0].db,
+                batch[0].user_id,
+                [entry.user_query for entry in batch],
+                merged_resources_by_tag,
+            )
+            for entry, result in zip(batch, results):
+                valid = _validate_selection(
+                    result.get("selected_tags", []),
+                    result.get("selected_resource_ids", []),
+                    entry.resources_by_tag,
+                )
+                entry.future.set_result(valid)
+        except Exception as e:
+            logger.warning("批量选择失败，逐个降级为关键词匹配: %s", e)
+            for entry in batch:
+                entry.future.set_result(
+                    _keyword_fallback(entry.user_query, entry.resources_by_tag)
+                )
+
+    async def _invoke_batched(
+        self,
+        db: Session,
+        user_id: int,
+        user_queries: List[str],
+        resources_by_tag: Dict[str, List[Resource]],
+    ) -> List[Dict]:
+        """一次LLM调用回答多个编号问题"""
+        available_tags = list(resources_by_tag.keys())
+        grouped_resources_text = _format_resources_by_tag(resources_by_tag)
+        queries_text = "\n".join(
+            [f"Q{i + 1}: {query}" for i, query in enumerate(user_queries)]
+        )
+
+        chain = (
+            _batched_selection_prompt
+            | create_chat_model(db, user_id, streaming=False)
+            | _batched_selection_parser
+        )
+
+        result = await chain.ainvoke(
             {
-                "user_query": user_query,
-                "resources_text": resources_text,
+                "queries_text": queries_text,
+                "available_tags": available_tags,
+                "grouped_resources_text": grouped_resources_text,
             }
         )
 
-        # 处理不同类型的返回结果
         if isinstance(result, dict):
-            selected_ids = result.get("selected_resource_ids", [])
-        elif hasattr(result, "selected_resource_ids"):
-            selected_ids = result.selected_resource_ids
+            raw_results = result.get("results", [])
+        elif hasattr(result, "results"):
+            raw_results = [item.model_dump() for item in result.results]
         else:
-            print(f"意外的结果类型: {type(result)}, 值: {result}")
-            selected_ids = []
-
-        # 验证ID是否存在于候选列表中
-        valid_ids = []
-        candidate_ids = [r["id"] for r in resource_candidates]
-
-        for resource_id in selected_ids:
-            if resource_id in candidate_ids:
-                valid_ids.append(resource_id)
+            logger.warning("意外的结果类型: %s, 值: %s", type(result), result)
+            raw_results = []
 
-        return valid_ids
+        if len(raw_results) != len(user_queries):
+            raise ValueError(
+                f"批量返回数量不匹配：期望 {len(user_queries)} 个，实际 {len(raw_results)} 个"
+            )
 
-    except Exception as e:
-        print(f"资源选择失败: {str(e)}")
-        # 兜底策略：基于关键词简单匹配
-        user_keywords = user_query.lower().split()
-        fallback_ids = []
+        return [
+            item if isinstance(item, dict) else item.model_dump()
+            for item in raw_results
+        ]
 
-        for resource in resource_candidates:
-            title_lower = resource["title"].lower()
-            if any(keyword in title_lower for keyword in user_keywords):
-                fallback_ids.append(resource["id"])
 
-        return fallback_ids
+# 模块级共享调度器，供异步调用方合并并发搜索
+search_selection_dispatcher = BatchedSearchDispatcher()
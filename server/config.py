@@ -19,6 +19,10 @@ class Settings(BaseSettings):
     AI_MODEL: str = "moonshotai/Kimi-K2-Instruct"
     AI_API_KEY: Optional[str] = None
 
+    # 外部服务并发上限（防止并发工具调用触发LLM/Jina限流）
+    LLM_CONCURRENCY: int = 8
+    JINA_CONCURRENCY: int = 4
+
     @property
     def app_data_dir(self) -> Optional[Path]:
         data_dir = os.environ.get("LINKBOX_DATA_DIR")
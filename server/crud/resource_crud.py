@@ -1,10 +1,11 @@
 from typing import List, Optional, Tuple
 
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.orm import Session, load_only, selectinload
 
 from crud.tag_crud import (
-    create_tag_if_not_exists,
+    get_or_create_tags,
     get_tags_by_resource,
     soft_delete_orphan_tags,
 )
@@ -33,20 +34,26 @@ def create_resource(
     # 创建资源
     db_resource = Resource(url=url, title=title, digest=digest, user_id=user_id)
     db.add(db_resource)
-    db.commit()
-    db.refresh(db_resource)
-
-    # 处理标签
-    for tag_name in tags:
-        tag_name = tag_name.strip()
-        if tag_name:
-            tag = create_tag_if_not_exists(db, user_id, tag_name)
-            resource_tag = ResourceTag(
-                resource_id=db_resource.id, tag_id=tag.id, user_id=user_id
-            )
-            db.add(resource_tag)
+    db.flush()  # 取得资源ID，与标签写入合并为一次提交
+
+    # 处理标签：批量解析/创建后用Core executemany一次性写入关联
+    # （关联行不需要回读ID或进入身份映射，跳过ORM逐对象的flush开销）
+    tag_objects = get_or_create_tags(db, user_id, tags)
+    if tag_objects:
+        db.execute(
+            insert(ResourceTag),
+            [
+                {
+                    "resource_id": db_resource.id,
+                    "tag_id": tag.id,
+                    "user_id": user_id,
+                }
+                for tag in tag_objects
+            ],
+        )
 
     db.commit()
+    db.refresh(db_resource)
     return db_resource
 
 
@@ -65,6 +72,26 @@ def get_resource_by_id(
     )
 
 
+def get_resource_with_tags_by_id(
+    db: Session, resource_id: int, user_id: int
+) -> Optional[Resource]:
+    """根据ID获取资源（标签批量预加载）
+
+    tags 关系是 lazy="raise"，脱离会话后还要读标签的调用方
+    必须走这个 selectinload 版本，而不是 get_resource_by_id。
+    """
+    return (
+        db.query(Resource)
+        .options(selectinload(Resource.tags))
+        .filter(
+            Resource.id == resource_id,
+            Resource.user_id == user_id,
+            Resource.is_deleted == False,
+        )
+        .first()
+    )
+
+
 def update_resource(
     db: Session,
     resource_id: int,
@@ -109,28 +136,41 @@ def update_resource(
                 ),
             ).update({"is_deleted": True})
 
-        # 添加新的标签关联
+        # 添加新的标签关联：批量解析标签后一次查出已有关联，其余批量插入
         tags_to_add = new_tag_names - current_tag_names
-        for tag_name in tags_to_add:
-            tag = create_tag_if_not_exists(db, user_id, tag_name)
-            # 检查是否存在已删除的关联
-            existing_relation = (
+        if tags_to_add:
+            tag_objects = get_or_create_tags(db, user_id, list(tags_to_add))
+            tag_ids_to_add = [tag.id for tag in tag_objects]
+
+            existing_relations = (
                 db.query(ResourceTag)
                 .filter(
                     ResourceTag.resource_id == resource_id,
-                    ResourceTag.tag_id == tag.id,
                     ResourceTag.user_id == user_id,
+                    ResourceTag.tag_id.in_(tag_ids_to_add),
                 )
-                .first()
+                .all()
             )
+            existing_by_tag_id = {
+                relation.tag_id: relation for relation in existing_relations
+            }
+
+            new_relation_rows = []
+            for tag in tag_objects:
+                existing_relation = existing_by_tag_id.get(tag.id)
+                if existing_relation:
+                    existing_relation.is_deleted = False
+                else:
+                    new_relation_rows.append(
+                        {
+                            "resource_id": resource_id,
+                            "tag_id": tag.id,
+                            "user_id": user_id,
+                        }
+                    )
 
-            if existing_relation:
-                existing_relation.is_deleted = False
-            else:
-                resource_tag = ResourceTag(
-                    resource_id=resource_id, tag_id=tag.id, user_id=user_id
-                )
-                db.add(resource_tag)
+            if new_relation_rows:
+                db.execute(insert(ResourceTag), new_relation_rows)
 
         if removed_tag_ids:
             soft_delete_orphan_tags(db, user_id, removed_tag_ids)
@@ -175,92 +215,120 @@ def delete_resource(db: Session, resource_id: int, user_id: int) -> bool:
     return True
 
 
+def _resource_load_options(include_digest: bool) -> list:
+    """列表查询的加载选项
+
+    digest是Text大字段，列表视图往往只渲染标题/链接；
+    include_digest=False 时只投影需要的列，减少磁盘与DB套接字传输量。
+    """
+    options = [selectinload(Resource.tags)]
+    if not include_digest:
+        options.append(
+            load_only(
+                Resource.id,
+                Resource.url,
+                Resource.title,
+                Resource.user_id,
+                Resource.created_at,
+                Resource.updated_at,
+            )
+        )
+    return options
+
+
 def get_resources_by_tag(
-    db: Session, user_id: int, tag_name: str, page: int = 1, size: int = 20
+    db: Session,
+    user_id: int,
+    tag_name: str,
+    page: int = 1,
+    size: int = 20,
+    include_digest: bool = True,
 ) -> Tuple[List[dict], int]:
-    """根据标签获取资源"""
-    # 查找标签
-    tag = (
-        db.query(Tag)
-        .filter(Tag.user_id == user_id, Tag.name == tag_name, Tag.is_deleted == False)
-        .first()
-    )
-
-    if not tag:
-        return [], 0
+    """根据标签获取资源
 
-    # 查找该标签下的资源
+    单次JOIN查询定位该标签下的资源，并通过 selectinload
+    批量加载每个资源的全部标签，避免逐资源的N+1查询。
+    """
     offset = (page - 1) * size
 
-    # 分步查询：先获取资源ID，再获取资源详情
-    # 第一步：获取该标签关联的所有资源ID
-    resource_tag_relations = (
-        db.query(ResourceTag.resource_id)
+    base_query = (
+        db.query(Resource)
+        .join(ResourceTag, ResourceTag.resource_id == Resource.id)
+        .join(Tag, Tag.id == ResourceTag.tag_id)
         .filter(
-            ResourceTag.tag_id == tag.id,
-            ResourceTag.user_id == user_id,
+            Tag.user_id == user_id,
+            Tag.name == tag_name,
+            Tag.is_deleted == False,
             ResourceTag.is_deleted == False,
+            Resource.is_deleted == False,
         )
-        .all()
     )
 
-    if not resource_tag_relations:
-        return [], 0
-
-    # 提取资源ID列表
-    resource_ids = [relation.resource_id for relation in resource_tag_relations]
-
-    # 第二步：根据资源ID查询资源详情
-    resources = (
-        db.query(Resource)
-        .filter(
-            Resource.id.in_(resource_ids),
-            Resource.is_deleted == False,
-        )
+    # 窗口函数在同一次扫描中带回总数，省掉独立的COUNT查询
+    rows = (
+        base_query.add_columns(func.count().over().label("total"))
+        .options(*_resource_load_options(include_digest))
         .order_by(Resource.created_at.desc())
         .offset(offset)
         .limit(size)
         .all()
     )
 
-    # 计算总数
-    total = (
-        db.query(Resource)
+    if not rows:
+        # 翻页越界时当前页为空，退回一次COUNT拿总数
+        total = base_query.count() if page > 1 else 0
+        return [], total
+
+    total = rows[0].total
+    results = [{"resource": row[0], "tags": row[0].tags} for row in rows]
+
+    return results, total
+
+
+def get_tagged_resources_by_user(
+    db: Session, user_id: int
+) -> List[Tuple[str, Resource]]:
+    """一次性获取用户所有标签及其关联资源
+
+    通过 Tag ↔ ResourceTag ↔ Resource 单次JOIN查询，
+    返回 (标签名, 资源对象) 元组列表，供AI搜索工作流使用。
+    """
+    return (
+        db.query(Tag.name, Resource)
+        .join(ResourceTag, ResourceTag.tag_id == Tag.id)
+        .join(Resource, Resource.id == ResourceTag.resource_id)
         .filter(
-            Resource.id.in_(resource_ids),
+            Tag.user_id == user_id,
+            Tag.is_deleted == False,
+            ResourceTag.is_deleted == False,
             Resource.is_deleted == False,
         )
-        .count()
+        .order_by(Tag.name)
+        .all()
     )
 
-    # 为每个资源获取所有标签（使用简化版本）
-    results = []
-    for resource in resources:
-        # 简化标签获取，避免复杂查询
-        resource_tags = (
-            db.query(ResourceTag.tag_id)
-            .filter(
-                ResourceTag.resource_id == resource.id,
-                ResourceTag.user_id == user_id,
-                ResourceTag.is_deleted == False,
-            )
-            .all()
-        )
-
-        tag_ids = [rt.tag_id for rt in resource_tags]
-        tags = (
-            (db.query(Tag).filter(Tag.id.in_(tag_ids), Tag.is_deleted == False).all())
-            if tag_ids
-            else []
-        )
 
-        results.append({"resource": resource, "tags": tags})
+def get_user_resources_with_tags(db: Session, user_id: int) -> List[Resource]:
+    """一次性取回用户全部未删除资源（标签批量预加载）
 
-    return results, total
+    供AI搜索工作流在LLM选标签的同时预取候选，之后在Python侧
+    按标签交集过滤，单条查询替代逐标签的N次往返。
+    """
+    return (
+        db.query(Resource)
+        .options(selectinload(Resource.tags))
+        .filter(Resource.user_id == user_id, Resource.is_deleted == False)
+        .order_by(Resource.created_at.desc())
+        .all()
+    )
 
 
 def get_resources_by_user(
-    db: Session, user_id: int, page: int = 1, size: int = 20
+    db: Session,
+    user_id: int,
+    page: int = 1,
+    size: int = 20,
+    include_digest: bool = True,
 ) -> Tuple[List[dict], int]:
     """按用户获取全部资源"""
     offset = (page - 1) * size
@@ -271,17 +339,42 @@ def get_resources_by_user(
         .order_by(Resource.created_at.desc())
     )
 
-    total = base_query.count()
-    resources = base_query.offset(offset).limit(size).all()
+    # 窗口函数在同一次扫描中带回总数，省掉独立的COUNT查询
+    rows = (
+        base_query.add_columns(func.count().over().label("total"))
+        .options(*_resource_load_options(include_digest))
+        .offset(offset)
+        .limit(size)
+        .all()
+    )
 
-    results: List[dict] = []
-    for resource in resources:
-        tags = get_tags_by_resource(db, resource.id, user_id)
-        results.append({"resource": resource, "tags": tags})
+    if not rows:
+        total = base_query.count() if page > 1 else 0
+        return [], total
+
+    total = rows[0].total
+    results = [{"resource": row[0], "tags": row[0].tags} for row in rows]
 
     return results, total
 
 
+# 与MySQL ngram_token_size 的默认值保持一致（见models.py的ngram全文索引）
+_NGRAM_TOKEN_SIZE = 2
+
+
+def _use_fulltext(db: Session, query: str) -> bool:
+    """是否可以走MySQL FULLTEXT索引
+
+    全文索引使用ngram解析器（中英文统一按2字符分词）。查询中
+    至少要有一个达到分词长度的词，否则 MATCH 必然空结果，
+    这类超短查询退回 ILIKE 模糊匹配。
+    """
+    bind = db.get_bind()
+    if bind is None or bind.dialect.name != "mysql":
+        return False
+    return any(len(token) >= _NGRAM_TOKEN_SIZE for token in query.split())
+
+
 def search_resources_multi_dimensional(
     db: Session, query: str, user_id: int, page: int = 1, size: int = 20
 ) -> Tuple[List[dict], int]:
@@ -298,21 +391,36 @@ def search_resources_multi_dimensional(
     Returns:
         (资源列表, 总数)
     """
-    search_term = f"%{query}%"
     offset = (page - 1) * size
 
+    if _use_fulltext(db, query):
+        # MySQL：走FULLTEXT倒排索引，避免前置通配符全表扫描
+        tag_name_predicate = mysql_match(Tag.name, against=query)
+        resource_text_predicate = mysql_match(
+            Resource.title, Resource.digest, against=query
+        )
+    else:
+        # SQLite或超短查询：退回LIKE模糊匹配
+        search_term = f"%{query}%"
+        tag_name_predicate = Tag.name.ilike(search_term)
+        resource_text_predicate = or_(
+            Resource.title.ilike(search_term),
+            Resource.digest.ilike(search_term),
+        )
+
     # 构建搜索查询
-    # 方式一：通过标签搜索
-    tag_resource_ids = (
-        db.query(ResourceTag.resource_id)
+    # 方式一：通过标签搜索（EXISTS半连接，优化器可从外表索引驱动）
+    tag_match_exists = (
+        db.query(ResourceTag)
         .join(Tag, ResourceTag.tag_id == Tag.id)
         .filter(
+            ResourceTag.resource_id == Resource.id,
             Tag.user_id == user_id,
-            Tag.name.ilike(search_term),
+            tag_name_predicate,
             Tag.is_deleted == False,
             ResourceTag.is_deleted == False,
         )
-        .subquery()
+        .exists()
     )
 
     # 方式二：直接在资源中搜索
@@ -323,43 +431,29 @@ def search_resources_multi_dimensional(
             Resource.is_deleted == False,
             or_(
                 # 通过标签匹配
-                Resource.id.in_(tag_resource_ids),
+                tag_match_exists,
                 # 直接在标题和摘要中搜索
-                Resource.title.ilike(search_term),
-                Resource.digest.ilike(search_term),
+                resource_text_predicate,
             ),
         )
         .order_by(Resource.created_at.desc())
     )
 
-    # 获取总数
-    total = resources_query.count()
-
-    # 分页查询
-    resources = resources_query.offset(offset).limit(size).all()
-
-    # 为每个资源获取标签
-    results = []
-    for resource in resources:
-        # 获取资源的标签
-        resource_tags = (
-            db.query(ResourceTag.tag_id)
-            .filter(
-                ResourceTag.resource_id == resource.id,
-                ResourceTag.user_id == user_id,
-                ResourceTag.is_deleted == False,
-            )
-            .all()
-        )
+    # 分页查询，窗口函数同扫描带回总数（selectinload批量加载标签）
+    rows = (
+        resources_query.add_columns(func.count().over().label("total"))
+        .options(selectinload(Resource.tags))
+        .offset(offset)
+        .limit(size)
+        .all()
+    )
 
-        tag_ids = [rt.tag_id for rt in resource_tags]
-        tags = (
-            (db.query(Tag).filter(Tag.id.in_(tag_ids), Tag.is_deleted == False).all())
-            if tag_ids
-            else []
-        )
+    if not rows:
+        total = resources_query.count() if page > 1 else 0
+        return [], total
 
-        results.append({"resource": resource, "tags": tags})
+    total = rows[0].total
+    results = [{"resource": row[0], "tags": row[0].tags} for row in rows]
 
     return results, total
 
@@ -379,14 +473,18 @@ def find_related_tags(db: Session, keywords: List[str], user_id: int) -> List[Ta
     if not keywords:
         return []
 
-    # 构建OR条件，匹配任意关键词
-    conditions = []
-    for keyword in keywords:
-        conditions.append(Tag.name.ilike(f"%{keyword}%"))
+    if _use_fulltext(db, " ".join(keywords)):
+        # MySQL：一次MATCH匹配全部关键词（自然语言模式取并集）
+        condition = mysql_match(Tag.name, against=" ".join(keywords))
+    else:
+        # 构建OR条件，匹配任意关键词
+        condition = or_(
+            *[Tag.name.ilike(f"%{keyword}%") for keyword in keywords]
+        )
 
     tags = (
         db.query(Tag)
-        .filter(Tag.user_id == user_id, Tag.is_deleted == False, or_(*conditions))
+        .filter(Tag.user_id == user_id, Tag.is_deleted == False, condition)
         .order_by(Tag.name)
         .all()
     )
@@ -412,16 +510,18 @@ def search_resources_by_content(
     search_term = f"%{query}%"
 
     if search_type == "tags":
-        # 只搜索标签
-        tag_resource_ids = (
-            db.query(ResourceTag.resource_id)
+        # 只搜索标签（EXISTS半连接）
+        tag_match_exists = (
+            db.query(ResourceTag)
             .join(Tag, ResourceTag.tag_id == Tag.id)
             .filter(
+                ResourceTag.resource_id == Resource.id,
                 Tag.user_id == user_id,
                 Tag.name.ilike(search_term),
                 Tag.is_deleted == False,
                 ResourceTag.is_deleted == False,
             )
+            .exists()
         )
 
         resources = (
@@ -429,8 +529,9 @@ def search_resources_by_content(
             .filter(
                 Resource.user_id == user_id,
                 Resource.is_deleted == False,
-                Resource.id.in_(tag_resource_ids),
+                tag_match_exists,
             )
+            .options(selectinload(Resource.tags))
             .order_by(Resource.created_at.desc())
             .all()
         )
@@ -444,6 +545,7 @@ def search_resources_by_content(
                 Resource.is_deleted == False,
                 Resource.title.ilike(search_term),
             )
+            .options(selectinload(Resource.tags))
             .order_by(Resource.created_at.desc())
             .all()
         )
@@ -457,6 +559,7 @@ def search_resources_by_content(
                 Resource.is_deleted == False,
                 Resource.digest.ilike(search_term),
             )
+            .options(selectinload(Resource.tags))
             .order_by(Resource.created_at.desc())
             .all()
         )
@@ -468,10 +571,6 @@ def search_resources_by_content(
         )
         return results
 
-    # 为每个资源获取标签
-    results = []
-    for resource in resources:
-        tags = get_tags_by_resource(db, resource.id, user_id)
-        results.append({"resource": resource, "tags": tags})
+    results = [{"resource": resource, "tags": resource.tags} for resource in resources]
 
     return results
@@ -1,20 +1,70 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
 from typing import List, Optional
 
+from cachetools import TTLCache
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from errors import BusinessError
 from models import ResourceTag, Tag
 
 
-def get_user_tags(db: Session, user_id: int) -> List[Tag]:
-    """获取用户的所有标签"""
-    return (
+@dataclass(frozen=True)
+class CachedTag:
+    """标签的只读快照，用于缓存（与ORM会话解耦）"""
+
+    id: int
+    name: str
+    user_id: int
+    created_at: Optional[datetime]
+
+
+# 用户标签列表缓存：标签只在增删时变化，搜索等热路径重复读取
+_user_tags_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_user_tags_cache_lock = threading.Lock()
+
+
+def _invalidate_user_tags_cache(user_id: int) -> None:
+    """标签发生增删改后使该用户的缓存失效"""
+    with _user_tags_cache_lock:
+        _user_tags_cache.pop(user_id, None)
+
+
+def get_user_tags(db: Session, user_id: int) -> List[CachedTag]:
+    """获取用户的所有标签（带60秒TTL缓存）
+
+    返回只读快照对象而非ORM实例，避免缓存条目跨请求
+    泄漏数据库会话状态。
+    """
+    with _user_tags_cache_lock:
+        cached = _user_tags_cache.get(user_id)
+    if cached is not None:
+        return list(cached)
+
+    tags = (
         db.query(Tag)
         .filter(Tag.user_id == user_id, Tag.is_deleted == False)
         .order_by(Tag.name)
         .all()
     )
 
+    snapshot = [
+        CachedTag(
+            id=tag.id,
+            name=tag.name,
+            user_id=tag.user_id,
+            created_at=tag.created_at,
+        )
+        for tag in tags
+    ]
+
+    with _user_tags_cache_lock:
+        _user_tags_cache[user_id] = snapshot
+
+    return list(snapshot)
+
 
 def get_tag_by_name(db: Session, user_id: int, tag_name: str) -> Optional[Tag]:
     """根据名称获取用户的标签"""
@@ -53,13 +103,15 @@ def create_tag(db: Session, user_id: int, tag_name: str) -> Tag:
         deleted_tag.is_deleted = False
         db.commit()
         db.refresh(deleted_tag)
+        _invalidate_user_tags_cache(user_id)
         return deleted_tag
 
     db_tag = Tag(name=tag_name, user_id=user_id)
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
-    
+    _invalidate_user_tags_cache(user_id)
+
     return db_tag
 
 
@@ -76,16 +128,112 @@ def create_tag_if_not_exists(db: Session, user_id: int, tag_name: str) -> Tag:
         deleted_tag.is_deleted = False
         db.commit()
         db.refresh(deleted_tag)
+        _invalidate_user_tags_cache(user_id)
         return deleted_tag
 
     db_tag = Tag(name=tag_name, user_id=user_id)
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
-    
+    _invalidate_user_tags_cache(user_id)
+
     return db_tag
 
 
+def _upsert_tags_sqlite(
+    db: Session, user_id: int, tag_names: List[str]
+) -> List[CachedTag]:
+    """SQLite单语句upsert：解析+创建+恢复软删除一次完成
+
+    依赖 unique_user_tag(user_id, name) 唯一索引做冲突判定，
+    RETURNING直接带回全部标签ID，省掉解析用的前置SELECT。
+    """
+    stmt = (
+        sqlite_insert(Tag)
+        .values([{"user_id": user_id, "name": name} for name in tag_names])
+        .on_conflict_do_update(
+            index_elements=["user_id", "name"],
+            set_={"is_deleted": False},
+        )
+        .returning(Tag.id, Tag.name)
+    )
+    id_by_name = {row.name: row.id for row in db.execute(stmt)}
+    return [
+        CachedTag(id=id_by_name[name], name=name, user_id=user_id, created_at=None)
+        for name in tag_names
+    ]
+
+
+def get_or_create_tags(
+    db: Session, user_id: int, tag_names: List[str]
+) -> List[CachedTag]:
+    """批量获取或创建标签（含恢复软删除的同名标签）
+
+    SQLite方言走单条 INSERT ... ON CONFLICT ... RETURNING upsert；
+    其他方言退回"单次IN查询解析 + add_all批量写入"的两步路径。
+    只flush不提交，事务由调用方统一收尾；返回只读快照，
+    调用方只依赖 id/name。
+    """
+    normalized: List[str] = []
+    seen = set()
+    for tag_name in tag_names:
+        tag_name = tag_name.strip()
+        if tag_name and tag_name not in seen:
+            seen.add(tag_name)
+            normalized.append(tag_name)
+
+    if not normalized:
+        return []
+
+    bind = db.get_bind()
+    if (
+        bind is not None
+        and bind.dialect.name == "sqlite"
+        and bind.dialect.insert_returning
+    ):
+        result = _upsert_tags_sqlite(db, user_id, normalized)
+        _invalidate_user_tags_cache(user_id)
+        return result
+
+    existing_tags = (
+        db.query(Tag)
+        .filter(Tag.user_id == user_id, Tag.name.in_(normalized))
+        .all()
+    )
+    tags_by_name = {tag.name: tag for tag in existing_tags}
+
+    restored = False
+    for tag in existing_tags:
+        if tag.is_deleted:
+            tag.is_deleted = False
+            restored = True
+
+    new_tags = [
+        Tag(name=tag_name, user_id=user_id)
+        for tag_name in normalized
+        if tag_name not in tags_by_name
+    ]
+    if new_tags:
+        db.add_all(new_tags)
+
+    if new_tags or restored:
+        db.flush()  # 批量写入并取得新标签ID
+        _invalidate_user_tags_cache(user_id)
+
+    for tag in new_tags:
+        tags_by_name[tag.name] = tag
+
+    return [
+        CachedTag(
+            id=tags_by_name[tag_name].id,
+            name=tag_name,
+            user_id=user_id,
+            created_at=tags_by_name[tag_name].created_at,
+        )
+        for tag_name in normalized
+    ]
+
+
 def delete_tag(db: Session, tag_id: int, user_id: int) -> bool:
     """删除标签（软删除）"""
     try:
@@ -110,6 +258,7 @@ def delete_tag(db: Session, tag_id: int, user_id: int) -> bool:
         ).update({"is_deleted": True})
         
         db.commit()
+        _invalidate_user_tags_cache(user_id)
         return True
         
     except Exception as e:
@@ -169,6 +318,11 @@ def soft_delete_orphan_tags(
         .all()
     }
 
+    orphaned = False
     for tag in candidate_tags:
         if tag.id not in active_tag_ids:
             tag.is_deleted = True
+            orphaned = True
+
+    if orphaned:
+        _invalidate_user_tags_cache(user_id)
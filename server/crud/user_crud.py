@@ -6,6 +6,20 @@ from config import settings
 from models import User
 
 
+def get_first_active_user_summary(db: Session):
+    """获取第一个可用用户的摘要行 (id, username, created_at, updated_at)
+
+    认证热路径只需要这几列，投影查询避免每次把password等
+    整行字段拉回来。用户不存在时返回None，由调用方走完整引导。
+    """
+    return (
+        db.query(User.id, User.username, User.created_at, User.updated_at)
+        .filter(User.is_deleted == False)
+        .order_by(User.id.asc())
+        .first()
+    )
+
+
 def get_first_active_user(db: Session) -> Optional[User]:
     """获取第一个可用用户，用于单用户模式复用已有数据。"""
     return (
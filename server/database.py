@@ -13,12 +13,17 @@ engine_kwargs = {
 if DATABASE_URL.startswith("sqlite"):
     engine_kwargs["connect_args"] = {"check_same_thread": False}
 else:
+    # 会话可能被慢速的LLM调用长时间占用，加大池容量避免取连接排队；
+    # 回收周期压到30分钟（远低于MySQL默认wait_timeout=28800），
+    # 失效连接由回收兜底，省掉pre_ping每次取连接前的一次SELECT往返
     engine_kwargs.update(
         {
-            "pool_size": 10,
-            "max_overflow": 20,
-            "pool_pre_ping": True,
-            "pool_recycle": 3600,
+            "pool_size": 30,
+            "max_overflow": 60,
+            "pool_pre_ping": False,
+            "pool_recycle": 1800,
+            # 池耗尽时快速失败，避免请求静默挂在默认30秒的取连接等待上
+            "pool_timeout": 5,
         }
     )
 
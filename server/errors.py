@@ -1,6 +1,7 @@
-from fastapi import HTTPException, Request
+import orjson
+from fastapi import HTTPException, Request, Response
 from fastapi.exceptions import ValidationException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import ValidationError
 
 
@@ -11,37 +12,39 @@ class BusinessError(Exception):
         super().__init__(self.message)
 
 
+# 响应体的固定部分在模块加载时构建一次；500响应整体不变，
+# 直接预序列化成字节，热错误路径上零序列化开销
+_BUSINESS_ERROR_BASE = {"error": "BUSINESS_ERROR", "detail": "业务处理失败"}
+_VALIDATION_ERROR_BASE = {"error": "VALIDATION_ERROR", "message": "数据验证失败"}
+_INTERNAL_ERROR_BYTES = orjson.dumps(
+    {
+        "error": "INTERNAL_SERVER_ERROR",
+        "message": "服务器内部错误",
+        "detail": "请稍后再试或联系管理员",
+    }
+)
+
+
 async def business_exception_handler(request: Request, exc: BusinessError):
     """业务异常处理器"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=400,
-        content={
-            "error": "BUSINESS_ERROR",
-            "message": exc.message,
-            "detail": "业务处理失败"
-        }
+        content={**_BUSINESS_ERROR_BASE, "message": exc.message},
     )
 
 
 async def validation_exception_handler(request: Request, exc: ValidationError):
     """数据验证异常处理器"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
-        content={
-            "error": "VALIDATION_ERROR",
-            "message": "数据验证失败",
-            "detail": exc.errors()
-        }
+        content={**_VALIDATION_ERROR_BASE, "detail": exc.errors()},
     )
 
 
 async def general_exception_handler(request: Request, exc: Exception):
     """通用异常处理器"""
-    return JSONResponse(
+    return Response(
+        content=_INTERNAL_ERROR_BYTES,
         status_code=500,
-        content={
-            "error": "INTERNAL_SERVER_ERROR",
-            "message": "服务器内部错误",
-            "detail": "请稍后再试或联系管理员"
-        }
+        media_type="application/json",
     )
@@ -24,12 +24,12 @@ _bootstrap_runtime_env(sys.argv)
 
 import uvicorn
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import ValidationError
 
 from config import settings
 from crud.user_crud import ensure_single_user
-from database import SessionLocal, create_tables
+from database import SessionLocal, create_tables, engine
 
 # 导入全局异常处理
 from errors import (
@@ -44,7 +44,12 @@ from routers.settings_router import router as settings_router
 from routers.tag_router import router as tag_router
 
 # 导入路由
+from routers.user_router import profile_fast_path
 from routers.user_router import router as user_router
+from utils.ai_client import close_shared_http_clients
+from utils.compression import SelectiveGZip
+from utils.cors import CORSLite
+from utils.web_scraper import close_jina_client
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -72,6 +77,9 @@ async def lifespan(app: FastAPI):
 
     # 关闭时执行
     logger.info("应用正在关闭...")
+    await close_shared_http_clients()
+    await close_jina_client()
+    engine.dispose()
 
 
 app = FastAPI(
@@ -79,23 +87,25 @@ app = FastAPI(
     description="智能链接收藏夹应用",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# 添加CORS中间件
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # 允许的前端地址
-    allow_credentials=False,
-    allow_methods=["*"],  # 允许所有HTTP方法
-    allow_headers=["*"],  # 允许所有HTTP头
-)
+# 添加CORS中间件（通配符场景下的纯ASGI轻量实现）
+app.add_middleware(CORSLite)
+
+# 大JSON响应启用gzip压缩，SSE流式路径绕过
+app.add_middleware(SelectiveGZip)
 
 # 注册全局异常处理器
 app.add_exception_handler(BusinessError, business_exception_handler)
 app.add_exception_handler(ValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 
-# 注册路由
+# 注册路由（/auth/profile 的原生ASGI快速路径先注册，按序优先命中；
+# APIRouter版本保留在OpenAPI文档中）
+app.add_route(
+    "/auth/profile", profile_fast_path, methods=["GET"], include_in_schema=False
+)
 app.include_router(user_router)
 app.include_router(resource_router)
 app.include_router(tag_router)
@@ -119,8 +129,13 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    # loop/http 取 "auto"：装了 uvloop/httptools 时自动启用（Windows 下
+    # uvloop 不可用，自动回退到 asyncio），本地单用户场景关掉访问日志
     uvicorn.run(
         app,
         host=os.environ.get("LINKBOX_HOST", "127.0.0.1"),
         port=int(os.environ.get("LINKBOX_PORT", "7032")),
+        loop="auto",
+        http="auto",
+        access_log=False,
     )
@@ -1,5 +1,6 @@
 from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -19,7 +20,10 @@ class User(Base):
     )
     is_deleted = Column(Boolean, default=False, comment="是否删除")
 
-    __table_args__ = (Index("idx_username", "username"),)
+    __table_args__ = (
+        Index("idx_username", "username"),
+        Index("idx_users_username_deleted", "username", "is_deleted"),
+    )
 
 
 class AISettings(Base):
@@ -56,7 +60,40 @@ class Resource(Base):
     )
     is_deleted = Column(Boolean, default=False, comment="是否删除")
 
-    __table_args__ = (Index("idx_resources_user_id", "user_id"),)
+    # 资源的有效标签（只读关联，供 selectinload 批量加载，避免N+1查询；
+    # lazy="raise" 让漏掉预加载的访问直接报错而不是悄悄退化为逐行查询）
+    tags = relationship(
+        "Tag",
+        secondary="resource_tags",
+        primaryjoin="and_(Resource.id == foreign(ResourceTag.resource_id), "
+        "ResourceTag.is_deleted == False)",
+        secondaryjoin="and_(foreign(ResourceTag.tag_id) == Tag.id, "
+        "Tag.is_deleted == False)",
+        viewonly=True,
+        lazy="raise",
+    )
+
+    __table_args__ = (
+        Index("idx_resources_user_id", "user_id"),
+        # 覆盖列表页的 (用户, 未删除, 按创建时间排序) 查询
+        Index(
+            "idx_resources_user_deleted_created",
+            "user_id",
+            "is_deleted",
+            "created_at",
+        ),
+        # 覆盖创建资源时的URL查重
+        Index("idx_resources_user_url", "user_id", "url"),
+        # MySQL下的全文索引（SQLite等其他方言忽略前缀，退化为普通索引）；
+        # 默认解析器无法切分中文，必须用ngram解析器（按2字符分词）
+        Index(
+            "ft_resource_title_digest",
+            "title",
+            "digest",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ),
+    )
 
 
 class Tag(Base):
@@ -76,6 +113,15 @@ class Tag(Base):
     __table_args__ = (
         Index("idx_tags_user_id", "user_id"),
         Index("unique_user_tag", "user_id", "name", unique=True),
+        # 覆盖 get_user_tags 的 (用户, 未删除, 按名称排序) 查询
+        Index("idx_tags_user_deleted_name", "user_id", "is_deleted", "name"),
+        # MySQL下的全文索引（其他方言退化为普通索引），ngram解析器支持中文
+        Index(
+            "ft_tag_name",
+            "name",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ),
     )
 
 
@@ -97,4 +143,7 @@ class ResourceTag(Base):
     __table_args__ = (
         Index("idx_user_id_tag_id", "user_id", "tag_id"),
         Index("unique_resource_tag", "resource_id", "tag_id", unique=True),
+        # 覆盖按标签找资源 / 按资源找标签的关联查询
+        Index("idx_rt_tag_user_deleted", "tag_id", "user_id", "is_deleted"),
+        Index("idx_rt_resource_user_deleted", "resource_id", "user_id", "is_deleted"),
     )
@@ -1,9 +1,16 @@
 import asyncio
-import json
-from typing import AsyncGenerator, Dict, Any, Optional
+import hashlib
+import logging
+import threading
+
+import orjson
+from cachetools import TTLCache
+from typing import AsyncGenerator, Dict, Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from typing_extensions import Annotated, TypedDict
@@ -14,6 +21,8 @@ from schemas.ai_schemas import ChatRequest
 from utils.ai_client import create_chat_model, get_effective_ai_settings
 from utils.auth import get_current_user
 
+logger = logging.getLogger(__name__)
+
 # 初始化路由器
 router = APIRouter(prefix="/ai", tags=["AI对话"])
 
@@ -44,6 +53,53 @@ AGENT_SYSTEM_PROMPT = """你是一个智能资源管理助手，可以帮助用
 
 请根据用户的需求选择合适的工具来完成任务。在调用工具时，请使用正确的参数格式。"""
 
+# 静态的系统消息与Agent提示模板在模块加载时构建一次，避免每轮对话重复编译
+_SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+# role→消息类查表：推导式里直接构造，替代逐条if/elif+append
+_ROLE_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage}
+
+_AGENT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", AGENT_SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ]
+)
+
+# SSE帧常量：前后缀与静态done帧预先编码，流式热循环里只序列化变化部分
+_SSE_DATA = b"data: "
+_SSE_END = b"\n\n"
+_SSE_DONE_FRAME = b'data: {"type": "done"}\n\n'
+
+
+def _sse_frame(data: Dict[str, Any]) -> bytes:
+    """把事件dict编码成SSE帧字节"""
+    return _SSE_DATA + orjson.dumps(data) + _SSE_END
+
+
+def _error_frame(message: str) -> bytes:
+    """错误事件帧：只有message是变化部分"""
+    return _sse_frame({"type": "error", "message": message})
+
+
+# 对话去重缓存：客户端重连/重试同一轮对话时直接回放已生成的SSE帧，
+# 用一次缓存查找换掉整次上游LLM调用（帧本身就是字节，内存开销很小）
+_chat_replay_cache: TTLCache = TTLCache(maxsize=256, ttl=60)
+_chat_replay_lock = threading.Lock()
+
+
+def _chat_replay_key(user_id: int, messages) -> bytes:
+    """按(用户, 完整消息序列)生成去重键，避免不同上下文误命中"""
+    hasher = hashlib.blake2b(user_id.to_bytes(8, "little"), digest_size=16)
+    for msg in messages:
+        hasher.update(msg.role.encode())
+        hasher.update(b"\x00")
+        hasher.update(msg.content.encode())
+        hasher.update(b"\x00")
+    return hasher.digest()
+
 # 注释：移除了全局的ProgressEventManager，改为在请求内部管理进度队列
 
 
@@ -62,44 +118,60 @@ async def ai_chat_stream(
     """
     try:
         llm = create_chat_model(db, current_user.id, streaming=True)
-        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
         # 检查是否有消息
         if not request.messages:
             raise HTTPException(status_code=400, detail="消息列表不能为空")
 
-        # 构建完整的消息历史
-        full_messages = []
-
-        # 添加系统提示
-        full_messages.append(SystemMessage(content=SYSTEM_PROMPT))
-
-        # 添加所有消息（包括历史消息和当前用户输入）
-        for msg in request.messages:
-            if msg.role == "user":
-                full_messages.append(HumanMessage(content=msg.content))
-            elif msg.role == "assistant":
-                full_messages.append(AIMessage(content=msg.content))
-            # system消息已经在最前面添加了，这里跳过
-
-        # 创建流式响应生成器
-        async def generate_response() -> AsyncGenerator[str, None]:
+        # 构建完整的消息历史（系统提示复用模块级单例；
+        # system消息已在最前面，其余角色查表构造）
+        full_messages = [
+            _SYSTEM_MESSAGE,
+            *(
+                _ROLE_MESSAGE_TYPES[msg.role](content=msg.content)
+                for msg in request.messages
+                if msg.role in _ROLE_MESSAGE_TYPES
+            ),
+        ]
+
+        replay_key = _chat_replay_key(current_user.id, request.messages)
+        with _chat_replay_lock:
+            cached_frames = _chat_replay_cache.get(replay_key)
+
+        # 创建流式响应生成器（直接产出bytes，省掉每块的二次编码）
+        async def generate_response() -> AsyncGenerator[bytes, None]:
+            if cached_frames is not None:
+                # 重复的同一轮对话：回放缓存帧，让出事件循环以保留流式体验
+                for frame in cached_frames:
+                    yield frame
+                    await asyncio.sleep(0)
+                return
+
+            frames = []
             try:
                 # 调用LLM流式生成
                 async for chunk in llm.astream(full_messages):
                     if chunk.content:
                         # 格式化为SSE格式
-                        data = {"type": "content", "content": chunk.content}
-                        yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                        frame = _sse_frame(
+                            {"type": "content", "content": chunk.content}
+                        )
+                        frames.append(frame)
+                        yield frame
 
                 # 发送结束信号
-                end_data = {"type": "done"}
-                yield f"data: {json.dumps(end_data, ensure_ascii=False)}\n\n"
+                yield _SSE_DONE_FRAME
+
+                # 只缓存完整走到done的响应，错误/中断不回放
+                frames.append(_SSE_DONE_FRAME)
+                with _chat_replay_lock:
+                    _chat_replay_cache[replay_key] = frames
 
             except Exception as e:
                 # 发送错误信息
-                error_data = {"type": "error", "error": f"AI响应生成失败: {str(e)}"}
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+                yield _sse_frame(
+                    {"type": "error", "error": f"AI响应生成失败: {str(e)}"}
+                )
 
         # 返回SSE流式响应
         return StreamingResponse(
@@ -117,16 +189,16 @@ async def ai_chat_stream(
 
 
 async def process_agent_event(
-    event: Dict[str, Any], model_name: str
+    event: Dict[str, Any], thinking_metadata: Dict[str, Any]
 ) -> Optional[Dict[str, Any]]:
     """处理 agent 事件并格式化为 SSE 数据"""
     event_kind = event.get("event")
     event_name = event.get("name", "")
     event_data = event.get("data", {})
     
-    # 调试日志
-    if event_kind not in ["on_chat_model_stream"]:  # 避免打印太多流数据
-        print(f"[Agent Event] kind={event_kind}, name={event_name}")
+    # 调试日志（%s延迟格式化，生产日志级别下只剩一次isEnabledFor判断）
+    if event_kind != "on_chat_model_stream":  # 避免记录太多流数据
+        logger.debug("[Agent Event] kind=%s, name=%s", event_kind, event_name)
     
     # AI 思考过程 (LLM 输出)
     if event_kind == "on_chat_model_stream":
@@ -135,7 +207,7 @@ async def process_agent_event(
             return {
                 "type": "thinking",
                 "content": chunk.content,
-                "metadata": {"model": model_name}
+                "metadata": thinking_metadata,
             }
     
     # 工具调用开始
@@ -194,16 +266,19 @@ async def ai_chat_agent(
     # 创建进度队列（每个请求独立的队列）
     progress_queue = asyncio.Queue()
     
-    async def generate_response() -> AsyncGenerator[str, None]:
+    async def generate_response() -> AsyncGenerator[bytes, None]:
+        from utils.langchain_tools import StreamingTool, get_tools
+
+        tools = []
         try:
             from langchain.agents import AgentExecutor, create_tool_calling_agent
-            from langchain_core.messages import AIMessage, HumanMessage
-            from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-            from utils.langchain_tools import get_tools
 
             # 创建进度回调函数（直接将进度数据放入队列）
             async def progress_callback(progress_data: Dict[str, Any]):
-                print(f"[Progress Callback] Received: {progress_data.get('type', 'unknown')}")
+                logger.debug(
+                    "[Progress Callback] Received: %s",
+                    progress_data.get("type", "unknown"),
+                )
                 await progress_queue.put(progress_data)
 
             effective_ai_settings = get_effective_ai_settings(db, current_user.id)
@@ -216,56 +291,60 @@ async def ai_chat_agent(
                 db=db
             )
             
-            # 创建提示模板
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", AGENT_SYSTEM_PROMPT),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("human", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ])
-            
-            # 创建 agent
-            agent = create_tool_calling_agent(llm, tools, prompt)
+            # 创建 agent（提示模板复用模块级单例）
+            agent = create_tool_calling_agent(llm, tools, _AGENT_PROMPT)
             agent_executor = AgentExecutor(
-                agent=agent, 
-                tools=tools, 
-                verbose=True,
-                handle_parsing_errors=True,  # 这会导致 _Exception 工具
+                agent=agent,
+                tools=tools,
+                verbose=False,  # verbose会把每一步写stdout，线上纯开销
+                # 传callable直接返回提示字符串，避免True模式走_Exception工具
+                handle_parsing_errors=lambda exc: "请用有效的工具调用格式重试",
                 max_iterations=3,  # 限制最大迭代次数
-                early_stopping_method="generate"  # 更好的停止策略
+                # "generate"在达到上限后还会多调一次LLM生成收尾回答，
+                # "force"直接返回，最坏情况LLM调用数封顶在max_iterations
+                early_stopping_method="force",
+                return_intermediate_steps=False,
             )
             
-            # 构建聊天历史
-            chat_history = []
-            for i in range(0, len(request.messages) - 1):
-                msg = request.messages[i]
-                if msg.role == "user":
-                    chat_history.append(HumanMessage(content=msg.content))
-                elif msg.role == "assistant":
-                    chat_history.append(AIMessage(content=msg.content))
+            # 构建聊天历史（最后一条是当前输入，不计入历史）
+            chat_history = [
+                _ROLE_MESSAGE_TYPES[msg.role](content=msg.content)
+                for msg in request.messages[:-1]
+                if msg.role in _ROLE_MESSAGE_TYPES
+            ]
             
             # 获取当前用户输入
             current_input = request.messages[-1].content if request.messages else ""
             
-            # 创建两个异步生成器
+            # 创建两个异步生成器（agent流结束时向进度队列投递哨兵，进度流随之收尾）
             agent_stream = process_agent_stream(
-                agent_executor, 
+                agent_executor,
                 {"input": current_input, "chat_history": chat_history},
                 effective_ai_settings.ai_model,
+                progress_queue,
+                tools,
             )
             progress_stream = process_progress_stream(progress_queue)
-            
-            # 并发处理两个流
+
+            # 并发处理两个流（agent流收尾时先冲刷工具进度队列再投递哨兵，
+            # 收尾的进度事件保证先于done帧送达）
             async for event_data in merge_streams(agent_stream, progress_stream):
                 if event_data:
-                    yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-            
+                    yield _sse_frame(event_data)
+
             # 发送完成信号
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-            
+            yield _SSE_DONE_FRAME
+
         except Exception as e:
-            error_data = {"type": "error", "message": str(e)}
-            yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+            yield _error_frame(str(e))
+        finally:
+            # 异常/客户端断开路径：回收仍在运行的进度消费任务
+            for tool in tools:
+                if (
+                    isinstance(tool, StreamingTool)
+                    and tool.progress_consumer is not None
+                ):
+                    tool.progress_consumer.cancel()
     
     return StreamingResponse(
         generate_response(),
@@ -279,83 +358,83 @@ async def ai_chat_agent(
     )
 
 
+# 进度流结束哨兵：agent流收尾时投递，进度流即刻退出而无需轮询超时
+_PROGRESS_DONE = object()
+
+
 async def process_agent_stream(
-    agent_executor: Any, inputs: Dict[str, Any], model_name: str
+    agent_executor: Any,
+    inputs: Dict[str, Any],
+    model_name: str,
+    progress_queue: asyncio.Queue,
+    tools: Optional[List[Any]] = None,
 ):
-    """处理 Agent 事件流"""
-    async for event in agent_executor.astream_events(inputs, version="v2"):
-        event_data = await process_agent_event(event, model_name)
-        if event_data:
-            yield event_data
+    """处理 Agent 事件流，结束时通知进度流收尾"""
+    from utils.langchain_tools import StreamingTool
+
+    # thinking块的元数据在整个流里不变，只构建一次
+    thinking_metadata = {"model": model_name}
+    try:
+        async for event in agent_executor.astream_events(inputs, version="v2"):
+            event_data = await process_agent_event(event, thinking_metadata)
+            if event_data:
+                yield event_data
+    finally:
+        # 先冲刷工具端的进度队列：此时进度流还在消费，
+        # 滞留的收尾事件（tool_progress/resource卡片）仍能送达前端
+        if tools:
+            for tool in tools:
+                if isinstance(tool, StreamingTool):
+                    await tool.aclose_progress_stream()
+        # 工具不会在agent结束后继续上报进度，让进度流退出
+        progress_queue.put_nowait(_PROGRESS_DONE)
 
 
 async def process_progress_stream(progress_queue: asyncio.Queue):
-    """处理进度事件流"""
-    consecutive_timeouts = 0
-    max_consecutive_timeouts = 50  # 连续超时5秒（50 * 0.1秒）后退出
-    
-    print("[Progress Stream] Started")
-    
+    """处理进度事件流（事件驱动，收到哨兵即退出）"""
     while True:
-        try:
-            progress_data = await asyncio.wait_for(progress_queue.get(), timeout=0.1)
-            print(f"[Progress Stream] Got progress data: {progress_data.get('type', 'unknown')}")
-            yield progress_data
-            consecutive_timeouts = 0  # 收到数据时重置计数器
-        except asyncio.TimeoutError:
-            consecutive_timeouts += 1
-            if consecutive_timeouts >= max_consecutive_timeouts:
-                # 长时间没有新的进度数据，认为处理已完成
-                print("[Progress Stream] Timeout reached, exiting")
-                break
-            continue
-        except Exception as e:
-            print(f"[Progress Stream] Error: {e}")
+        progress_data = await progress_queue.get()
+        if progress_data is _PROGRESS_DONE:
             break
+        yield progress_data
+
+
+# 单个流结束的哨兵
+_STREAM_DONE = object()
 
 
 async def merge_streams(*streams):
-    """合并多个异步流"""
-    queue = asyncio.Queue()
-    tasks = []
-    
-    async def queue_events(stream, stream_index):
+    """合并多个异步流
+
+    每个流结束时投递哨兵，消费端按计数收尾；进度流由agent流的
+    哨兵自行终止，不再需要按流编号打包事件和提前取消的启发式。
+    队列设上限：下游HTTP客户端消费慢时对LLM生产者形成背压，
+    而不是无限缓冲流式token。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+
+    async def pump(stream):
         try:
             async for event in stream:
-                await queue.put((stream_index, event))
+                await queue.put(event)
         except Exception as e:
-            await queue.put((stream_index, {"type": "error", "message": str(e)}))
+            await queue.put({"type": "error", "message": str(e)})
         finally:
-            await queue.put((stream_index, None))  # 标记流结束
-    
-    # 为每个流创建任务
-    for i, stream in enumerate(streams):
-        task = asyncio.create_task(queue_events(stream, i))
-        tasks.append(task)
-    
-    # 统计活跃的流
+            await queue.put(_STREAM_DONE)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+
     active_streams = len(streams)
-    agent_stream_ended = False  # 标记agent流是否已结束
-    
-    # 从队列中读取事件
-    while active_streams > 0:
-        stream_index, event = await queue.get()
-        
-        if event is None:
-            # 如果是第一个流（agent_stream）结束，标记
-            if stream_index == 0:
-                agent_stream_ended = True
-            active_streams -= 1
-            
-            # 如果agent流已结束且只剩progress流，可以提前结束
-            if agent_stream_ended and active_streams == 1:
-                # 取消剩余的progress流任务
-                for task in tasks:
-                    if not task.done():
-                        task.cancel()
-                break
-        else:
+    try:
+        while active_streams > 0:
+            event = await queue.get()
+            if event is _STREAM_DONE:
+                active_streams -= 1
+                continue
             yield event
-    
-    # 等待所有任务完成或被取消
-    await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        # 消费端提前退出（如客户端断开）时回收生产任务
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,6 +2,7 @@ import math
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from crud import resource_crud, tag_crud
@@ -11,6 +12,8 @@ from models import User
 from schemas.resource_schemas import (
     ResourceCreateRequest,
     ResourceListResponse,
+    ResourcePreviewBatchRequest,
+    ResourcePreviewBatchResponse,
     ResourcePreviewRequest,
     ResourcePreviewResponse,
     ResourceResponse,
@@ -20,17 +23,22 @@ from utils.auth import get_current_user
 
 router = APIRouter(prefix="/resources", tags=["资源管理"])
 
+# 整表校验适配器：单次pydantic-core调用校验整页数据，摊销逐行model_validate的开销
+_resource_list_adapter = TypeAdapter(List[ResourceResponse])
+
 
 def _build_resource_list_response(
     resources_data: List[dict], total: int, page: int, size: int
 ) -> ResourceListResponse:
     """构建资源列表响应"""
-    resources_response: List[ResourceResponse] = []
-    for item in resources_data:
-        resource = item["resource"]
-        tags = item["tags"]
-        resource_dict = {**resource.__dict__, "tags": [tag.name for tag in tags]}
-        resources_response.append(ResourceResponse.model_validate(resource_dict))
+    payload = [
+        {
+            **item["resource"].__dict__,
+            "tags": [tag.name for tag in item["tags"]],
+        }
+        for item in resources_data
+    ]
+    resources_response = _resource_list_adapter.validate_python(payload)
 
     pages = math.ceil(total / size) if total > 0 else 1
 
@@ -50,14 +58,18 @@ def _build_resource_list_response(
     summary="获取用户资源列表",
     include_in_schema=False,
 )
-async def list_resources(
+def list_resources(
     tag: Optional[str] = None,
     page: int = 1,
     size: int = 20,
+    include_digest: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """按需获取资源列表，未指定标签时返回全部资源"""
+    """按需获取资源列表，未指定标签时返回全部资源
+
+    - **include_digest**: 为False时不加载摘要大字段，只取列表视图所需的列
+    """
     if page < 1:
         page = 1
     if size < 1 or size > 100:
@@ -66,11 +78,11 @@ async def list_resources(
     try:
         if tag:
             resources_data, total = resource_crud.get_resources_by_tag(
-                db, current_user.id, tag, page, size
+                db, current_user.id, tag, page, size, include_digest=include_digest
             )
         else:
             resources_data, total = resource_crud.get_resources_by_user(
-                db, current_user.id, page, size
+                db, current_user.id, page, size, include_digest=include_digest
             )
 
         return _build_resource_list_response(resources_data, total, page, size)
@@ -84,10 +96,11 @@ async def list_resources(
     response_model=ResourceListResponse,
     summary="按标签分页查询资源",
 )
-async def get_resources_by_tag(
+def get_resources_by_tag(
     tag_name: str,
     page: int = 1,
     size: int = 20,
+    include_digest: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -97,6 +110,7 @@ async def get_resources_by_tag(
     - **tag_name**: 标签名称
     - **page**: 页码，从1开始
     - **size**: 每页数量，默认20，最大100
+    - **include_digest**: 是否携带摘要大字段，前端要渲染摘要卡片，默认带上，可显式传False瘦身
     """
     # 限制分页参数
     if page < 1:
@@ -106,7 +120,7 @@ async def get_resources_by_tag(
 
     try:
         resources_data, total = resource_crud.get_resources_by_tag(
-            db, current_user.id, tag_name, page, size
+            db, current_user.id, tag_name, page, size, include_digest=include_digest
         )
 
         return _build_resource_list_response(resources_data, total, page, size)
@@ -116,7 +130,7 @@ async def get_resources_by_tag(
 
 
 @router.put("/{resource_id}", response_model=ResourceResponse, summary="更新资源")
-async def update_resource(
+def update_resource(
     resource_id: int,
     resource_data: ResourceUpdate,
     current_user: User = Depends(get_current_user),
@@ -163,7 +177,7 @@ async def update_resource(
 
 
 @router.delete("/{resource_id}", summary="删除资源")
-async def delete_resource(
+def delete_resource(
     resource_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -205,18 +219,23 @@ async def create_resource_preview(
     """
     try:
         # 导入所需模块
+        from fastapi.concurrency import run_in_threadpool
+
         from utils.web_scraper import fetch_web_content_to_markdown
-        from utils.ai_generator import generate_resource_summary
-        
-        # 获取网页内容
-        web_content = fetch_web_content_to_markdown(str(request.url))
-        
+        from utils.ai_generator import agenerate_resource_summary
+
+        # 获取网页内容（同步requests调用，移入线程池避免阻塞事件循环）
+        web_content = await run_in_threadpool(
+            fetch_web_content_to_markdown, str(request.url)
+        )
+
         # 获取用户已有的标签
         user_tags = tag_crud.get_user_tags(db, current_user.id)
         user_tag_names = [tag.name for tag in user_tags]
-        
-        # 使用AI生成摘要，并传递用户已有标签
-        summary = generate_resource_summary(
+
+        # 使用AI生成摘要（异步LLM调用，等待期间不占用工作线程），
+        # 并传递用户已有标签
+        summary = await agenerate_resource_summary(
             db=db,
             user_id=current_user.id,
             web_content=web_content,
@@ -237,8 +256,72 @@ async def create_resource_preview(
         raise HTTPException(status_code=500, detail=f"生成资源预览失败: {str(e)}")
 
 
+@router.post(
+    "/preview/batch",
+    response_model=ResourcePreviewBatchResponse,
+    summary="批量生成资源预览",
+)
+async def create_resource_previews_batch(
+    request: ResourcePreviewBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    批量根据URL生成资源预览（如批量导入场景）
+
+    - **items**: 链接+备注列表，单次最多10条
+
+    抓取并发进行，LLM调用通过abatch在共享连接池上并行
+    """
+    try:
+        import asyncio
+
+        from fastapi.concurrency import run_in_threadpool
+
+        from utils.web_scraper import fetch_web_content_to_markdown
+        from utils.ai_generator import agenerate_resource_summaries_batch
+
+        # 并发抓取全部网页内容（同步requests调用移入线程池）
+        web_contents = await asyncio.gather(
+            *(
+                run_in_threadpool(fetch_web_content_to_markdown, item.url)
+                for item in request.items
+            )
+        )
+
+        user_tags = tag_crud.get_user_tags(db, current_user.id)
+        user_tag_names = [tag.name for tag in user_tags]
+
+        summaries = await agenerate_resource_summaries_batch(
+            db=db,
+            user_id=current_user.id,
+            items=[
+                (web_content, item.note)
+                for web_content, item in zip(web_contents, request.items)
+            ],
+            user_tags=user_tag_names,
+        )
+
+        return ResourcePreviewBatchResponse(
+            previews=[
+                ResourcePreviewResponse(
+                    title=summary.title,
+                    tags=summary.tags,
+                    digest=summary.digest,
+                    url=item.url,
+                )
+                for summary, item in zip(summaries, request.items)
+            ]
+        )
+
+    except BusinessError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量生成资源预览失败: {str(e)}")
+
+
 @router.post("/", response_model=ResourceResponse, summary="创建资源")
-async def create_resource(
+def create_resource(
     request: ResourceCreateRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
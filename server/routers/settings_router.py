@@ -17,7 +17,7 @@ router = APIRouter(prefix="/settings", tags=["应用设置"])
 
 
 @router.get("/ai", response_model=AISettingsResponse, summary="获取 AI 配置")
-async def get_ai_settings(
+def get_ai_settings(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -32,7 +32,7 @@ async def get_ai_settings(
 
 
 @router.put("/ai", response_model=AISettingsResponse, summary="保存 AI 配置")
-async def update_ai_settings(
+def update_ai_settings(
     payload: AISettingsUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from crud import tag_crud
@@ -12,9 +13,12 @@ from utils.auth import get_current_user
 
 router = APIRouter(prefix="/tags", tags=["标签管理"])
 
+# 整表校验适配器：单次pydantic-core调用校验全部标签，摊销逐个model_validate的开销
+_tag_list_adapter = TypeAdapter(List[TagResponse])
+
 
 @router.get("/", response_model=List[TagResponse], summary="获取用户所有标签")
-async def get_user_tags(
+def get_user_tags(
     current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
 ):
     """
@@ -24,14 +28,14 @@ async def get_user_tags(
     """
     try:
         tags = tag_crud.get_user_tags(db, current_user.id)
-        return [TagResponse.model_validate(tag) for tag in tags]
+        return _tag_list_adapter.validate_python(tags, from_attributes=True)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取标签失败: {str(e)}")
 
 
 @router.post("/", response_model=TagResponse, summary="创建标签")
-async def create_tag(
+def create_tag(
     tag_request: TagCreateRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -52,7 +56,7 @@ async def create_tag(
 
 
 @router.delete("/{tag_id}", response_model=TagDeleteResponse, summary="删除标签")
-async def delete_tag(
+def delete_tag(
     tag_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1,15 +1,42 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import ORJSONResponse
 
 from models import User
-from schemas.user_schemas import UserProfile
-from utils.auth import get_current_user
+from utils.auth import get_current_user, load_current_user
 
 router = APIRouter(prefix="/auth", tags=["用户"])
 
 
-@router.get("/profile", response_model=UserProfile, summary="获取用户信息")
-async def get_profile(current_user: User = Depends(get_current_user)):
+async def profile_fast_path(request: Request) -> ORJSONResponse:
+    """纯ASGI版 /auth/profile，绕过FastAPI依赖解析
+
+    该接口只是"读缓存快照→返回dict"，不值得每次请求都跑依赖注入
+    与参数校验。在 main.py 里以原生路由注册在APIRouter版本之前；
+    缓存未命中时的同步DB加载至多每个TTL周期发生一次。
+    """
+    user = load_current_user()
+    return ORJSONResponse(
+        {
+            "id": user.id,
+            "username": user.username,
+            "created_at": user.created_at,
+            "updated_at": user.updated_at,
+        }
+    )
+
+
+@router.get("/profile", summary="获取用户信息")
+def get_profile(current_user: User = Depends(get_current_user)):
     """
     获取本地当前用户信息。
+
+    数据来自我们自己的用户快照（已受信任），直接组装dict返回，
+    跳过响应模型的二次校验；字段与原 UserProfile 一致。
+    实际流量走 profile_fast_path，本路由保留OpenAPI文档与兜底。
     """
-    return UserProfile.model_validate(current_user)
+    return {
+        "id": current_user.id,
+        "username": current_user.username,
+        "created_at": current_user.created_at,
+        "updated_at": current_user.updated_at,
+    }
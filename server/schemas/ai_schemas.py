@@ -1,6 +1,6 @@
 from typing import List, Literal, Optional, Dict, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ToolCall(BaseModel):
@@ -9,6 +9,9 @@ class ToolCall(BaseModel):
     name: str
     args: Dict[str, Any]
 
+    # 客户端消息几乎从不携带tool_calls，嵌套校验器延迟到真用到再编译
+    model_config = ConfigDict(defer_build=True)
+
 
 class ChatMessage(BaseModel):
     """聊天消息模型"""
@@ -1,6 +1,18 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+def _validate_http_url(url: str) -> str:
+    """轻量URL校验：只确认scheme，完整解析交给后续的真实抓取
+
+    HttpUrl每次请求都跑完整的RFC 3986解析，而URL随后总会被fetch，
+    fetch本身就是最终校验。
+    """
+    url = url.strip()
+    if not url.startswith(("http://", "https://")):
+        raise ValueError("URL必须以 http:// 或 https:// 开头")
+    return url
 
 
 class ResourceResponse(BaseModel):
@@ -8,14 +20,14 @@ class ResourceResponse(BaseModel):
     id: int
     url: str
     title: str
-    digest: str
+    # 列表接口可选择不加载digest（Text大字段），此时为None
+    digest: Optional[str] = None
     user_id: int
     tags: List[str] = Field(default_factory=list, description="资源标签列表")
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ResourceUpdate(BaseModel):
@@ -36,9 +48,11 @@ class ResourceListResponse(BaseModel):
 
 class ResourcePreviewRequest(BaseModel):
     """资源预览请求模型"""
-    url: HttpUrl = Field(..., description="资源链接")
+    url: str = Field(..., max_length=2048, description="资源链接")
     note: Optional[str] = Field("", description="用户备注")
 
+    _check_url = field_validator("url")(_validate_http_url)
+
 
 class ResourcePreviewResponse(BaseModel):
     """资源预览响应模型"""
@@ -48,9 +62,23 @@ class ResourcePreviewResponse(BaseModel):
     url: str = Field(..., description="原始链接")
 
 
+class ResourcePreviewBatchRequest(BaseModel):
+    """批量资源预览请求模型"""
+    items: List[ResourcePreviewRequest] = Field(
+        ..., min_length=1, max_length=10, description="待预览的链接列表"
+    )
+
+
+class ResourcePreviewBatchResponse(BaseModel):
+    """批量资源预览响应模型"""
+    previews: List[ResourcePreviewResponse] = Field(description="预览结果列表")
+
+
 class ResourceCreateRequest(BaseModel):
     """创建资源请求模型"""
-    url: HttpUrl = Field(..., description="资源链接")
+    url: str = Field(..., max_length=2048, description="资源链接")
     title: str = Field(..., max_length=500, description="资源标题")
     tags: List[str] = Field(..., description="标签列表")
-    digest: str = Field(..., description="资源摘要")
\ No newline at end of file
+    digest: str = Field(..., description="资源摘要")
+
+    _check_url = field_validator("url")(_validate_http_url)
\ No newline at end of file
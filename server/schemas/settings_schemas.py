@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class AISettingsBase(BaseModel):
@@ -17,8 +17,8 @@ class AISettingsResponse(AISettingsBase):
 
     updated_at: Optional[datetime] = Field(default=None, description="最近更新时间")
 
-    class Config:
-        from_attributes = True
+    # 设置页低频访问，延迟到首次使用再编译schema
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
 
 
 class AISettingsUpdate(AISettingsBase):
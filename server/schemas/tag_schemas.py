@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TagResponse(BaseModel):
@@ -10,8 +10,7 @@ class TagResponse(BaseModel):
     user_id: int = Field(description="用户ID")
     created_at: Optional[datetime] = Field(default=None, description="创建时间")
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TagCreateRequest(BaseModel):
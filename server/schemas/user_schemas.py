@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class UserProfile(BaseModel):
@@ -10,5 +10,5 @@ class UserProfile(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    # 统一v2风格配置；该模型已不在热路径上，延迟到首次使用再编译
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
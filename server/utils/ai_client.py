@@ -1,4 +1,6 @@
 from typing import Any, Optional
+
+import httpx
 from sqlalchemy.orm import Session
 
 from config import settings
@@ -6,6 +8,24 @@ from crud.ai_settings_crud import get_ai_settings_by_user
 from errors import BusinessError
 from schemas.settings_schemas import AISettingsUpdate
 
+# 进程级共享的HTTP连接池：保持到AI服务商的TLS长连接，
+# 省掉每次对话的握手开销（对首token延迟影响最明显）
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=60
+)
+_HTTP_TIMEOUT = httpx.Timeout(connect=5, read=120, write=10, pool=5)
+
+_shared_http_client = httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+_shared_http_async_client = httpx.AsyncClient(
+    limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT
+)
+
+
+async def close_shared_http_clients() -> None:
+    """应用关闭时释放共享连接池（在 lifespan 收尾阶段调用）。"""
+    _shared_http_client.close()
+    await _shared_http_async_client.aclose()
+
 
 def _normalize_ai_settings(
     ai_base_url: Optional[str],
@@ -55,6 +75,12 @@ def build_chat_model(
         api_key=config.ai_api_key,
         model=config.ai_model,
         streaming=streaming,
+        timeout=60,
+        # 重试交给上层兜底逻辑，避免服务商抖动时延迟成倍放大
+        max_retries=1,
+        # 复用共享连接池，而不是每个客户端实例各开一条HTTPS连接
+        http_client=_shared_http_client,
+        http_async_client=_shared_http_async_client,
     )
 
 
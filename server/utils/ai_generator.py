@@ -1,8 +1,12 @@
+import hashlib
+import threading
+
+from cachetools import TTLCache
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
-    SystemMessagePromptTemplate,
 )
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
@@ -18,6 +22,93 @@ class ResourceSummary(BaseModel):
     digest: str = Field(..., description="资源摘要")
 
 
+# 解析器/格式说明/提示模板都是静态的，模块加载时构建一次：
+# schema生成与模板解析是每次调用里最贵的纯CPU部分
+_summary_parser = PydanticOutputParser(pydantic_object=ResourceSummary)
+
+# 系统提示没有任何模板变量，直接用SystemMessage常量，
+# 格式化阶段无需对它做变量扫描和渲染
+_SYSTEM_TEXT = """
+        你是一个网页内容提取总结专家，用户觉得一个网页链接的内容很好，想要收藏，你需要根据网页内容和用户的备注，提炼出网页内容的标题，摘要，以及3-5个标签(要求精简凝练)。
+
+        重要指导原则：
+        1. 网页内容是从链接中爬取的文本内容，可能会混杂很多广告，推荐等等无效信息，请你甄别明晰，找出链接真正的主要的内容。
+        2. 如果用户提供了已有标签列表，请优先考虑使用用户已有的标签，这样可以保持用户的标签分类习惯的一致性。
+        3. 你可以从用户已有标签中选择合适的标签，也可以生成新的标签，但要确保标签能准确反映内容特征。
+        4. 标签应该简洁明了，避免过于宽泛或过于具体。
+        5. 如果内容与用户已有标签高度匹配，优先使用已有标签；如果内容有新的特征，可以生成新标签。
+        """
+
+_summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=_SYSTEM_TEXT),
+        HumanMessagePromptTemplate.from_template(
+            template="""
+        <网页内容>{web_content}</网页内容>
+        <用户备注>{user_note}</用户备注>
+        <用户已有标签>{tags_reference}</用户已有标签>
+        <输出要求>{format_instructions}</输出要求>
+        """,
+            input_variables=["web_content", "user_note", "tags_reference"],
+            partial_variables={
+                "format_instructions": _summary_parser.get_format_instructions()
+            },
+        ),
+    ]
+)
+
+
+# 摘要结果缓存：同一页面反复预览（刷新、改标签再看）时跳过整次LLM往返。
+# 键取抓取内容的哈希而非URL——真正喂给模型的是内容
+_summary_cache: TTLCache = TTLCache(maxsize=1000, ttl=24 * 3600)
+_summary_cache_lock = threading.Lock()
+
+
+def _summary_cache_key(
+    user_id: int, web_content: str, user_note: str, user_tags: list
+) -> bytes:
+    """按(用户, 内容, 备注, 标签集合)生成缓存键"""
+    hasher = hashlib.blake2b(user_id.to_bytes(8, "little"), digest_size=16)
+    hasher.update(web_content.encode())
+    hasher.update(b"\x00")
+    hasher.update(user_note.encode())
+    for tag in sorted(user_tags):
+        hasher.update(b"\x00")
+        hasher.update(tag.encode())
+    return hasher.digest()
+
+
+def _summary_cache_get(key: bytes):
+    with _summary_cache_lock:
+        cached = _summary_cache.get(key)
+    # 返回副本，防止调用方改动污染缓存条目
+    return cached.model_copy(deep=True) if cached is not None else None
+
+
+def _summary_cache_put(key: bytes, summary: "ResourceSummary") -> None:
+    with _summary_cache_lock:
+        _summary_cache[key] = summary.model_copy(deep=True)
+
+
+def _build_summary_chain(db: Session, user_id: int):
+    """组装摘要链及其输入（LLM依赖用户配置，按请求构建）"""
+    llm = create_chat_model(db, user_id, streaming=False)
+    return _summary_prompt | llm | _summary_parser
+
+
+def _build_summary_inputs(web_content: str, user_note: str, user_tags: list) -> dict:
+    """构建摘要链的模板变量"""
+    tags_reference = ""
+    if user_tags:
+        tags_reference = f"\n<用户已有标签>{', '.join(user_tags)}</用户已有标签>"
+
+    return {
+        "web_content": web_content,
+        "user_note": user_note,
+        "tags_reference": tags_reference,
+    }
+
+
 def generate_resource_summary(
     db: Session,
     user_id: int,
@@ -36,54 +127,74 @@ def generate_resource_summary(
     Returns:
         ResourceSummary: 包含标题、标签和摘要的资源摘要
     """
-    if user_tags is None:
-        user_tags = []
+    user_tags = user_tags or []
+    cache_key = _summary_cache_key(user_id, web_content, user_note, user_tags)
+    cached = _summary_cache_get(cache_key)
+    if cached is not None:
+        return cached
 
-    parser = PydanticOutputParser(pydantic_object=ResourceSummary)
+    chain = _build_summary_chain(db, user_id)
+    result = chain.invoke(_build_summary_inputs(web_content, user_note, user_tags))
+    _summary_cache_put(cache_key, result)
+    return result
 
-    # 构建标签参考信息
-    tags_reference = ""
-    if user_tags:
-        tags_reference = f"\n<用户已有标签>{', '.join(user_tags)}</用户已有标签>"
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessagePromptTemplate.from_template(
-                template="""
-        你是一个网页内容提取总结专家，用户觉得一个网页链接的内容很好，想要收藏，你需要根据网页内容和用户的备注，提炼出网页内容的标题，摘要，以及3-5个标签(要求精简凝练)。
+async def agenerate_resource_summaries_batch(
+    db: Session,
+    user_id: int,
+    items: "list[tuple[str, str]]",
+    user_tags: list[str] = None,
+) -> "list[ResourceSummary]":
+    """批量生成资源摘要（批量导入场景）
 
-        重要指导原则：
-        1. 网页内容是从链接中爬取的文本内容，可能会混杂很多广告，推荐等等无效信息，请你甄别明晰，找出链接真正的主要的内容。
-        2. 如果用户提供了已有标签列表，请优先考虑使用用户已有的标签，这样可以保持用户的标签分类习惯的一致性。
-        3. 你可以从用户已有标签中选择合适的标签，也可以生成新的标签，但要确保标签能准确反映内容特征。
-        4. 标签应该简洁明了，避免过于宽泛或过于具体。
-        5. 如果内容与用户已有标签高度匹配，优先使用已有标签；如果内容有新的特征，可以生成新标签。
-        """
-            ),
-            HumanMessagePromptTemplate.from_template(
-                template="""
-        <网页内容>{web_content}</网页内容>
-        <用户备注>{user_note}</用户备注>
-        <用户已有标签>{tags_reference}</用户已有标签>
-        <输出要求>{format_instructions}</输出要求>
-        """,
-                input_variables=["web_content", "user_note", "tags_reference"],
-                partial_variables={
-                    "format_instructions": parser.get_format_instructions()
-                },
-            ),
+    items 为 (web_content, user_note) 列表。命中缓存的条目直接返回，
+    其余通过 chain.abatch 在共享异步连接池上并发请求LLM，
+    吞吐随I/O并行度扩展而不是逐条串行。
+    """
+    user_tags = user_tags or []
+
+    keys = [
+        _summary_cache_key(user_id, web_content, user_note, user_tags)
+        for web_content, user_note in items
+    ]
+    results: "list[ResourceSummary]" = [_summary_cache_get(key) for key in keys]
+
+    miss_indexes = [i for i, cached in enumerate(results) if cached is None]
+    if miss_indexes:
+        chain = _build_summary_chain(db, user_id)
+        inputs = [
+            _build_summary_inputs(items[i][0], items[i][1], user_tags)
+            for i in miss_indexes
         ]
-    )
+        outputs = await chain.abatch(inputs, config={"max_concurrency": 8})
+        for i, summary in zip(miss_indexes, outputs):
+            _summary_cache_put(keys[i], summary)
+            results[i] = summary
 
-    llm = create_chat_model(db, user_id, streaming=False)
-    prompt_and_llm = prompt | llm
-    output = prompt_and_llm.invoke(
-        {
-            "web_content": web_content,
-            "user_note": user_note,
-            "tags_reference": tags_reference,
-        }
-    )
-    result = parser.invoke(output)
+    return results
+
+
+async def agenerate_resource_summary(
+    db: Session,
+    user_id: int,
+    web_content: str,
+    user_note: str = "",
+    user_tags: list[str] = None,
+) -> ResourceSummary:
+    """generate_resource_summary 的异步版本
+
+    LLM往返走共享的异步HTTP连接池，多秒的等待期间不占用
+    线程池工作线程，事件循环可以继续处理其他请求。
+    """
+    user_tags = user_tags or []
+    cache_key = _summary_cache_key(user_id, web_content, user_note, user_tags)
+    cached = _summary_cache_get(cache_key)
+    if cached is not None:
+        return cached
 
+    chain = _build_summary_chain(db, user_id)
+    result = await chain.ainvoke(
+        _build_summary_inputs(web_content, user_note, user_tags)
+    )
+    _summary_cache_put(cache_key, result)
     return result
@@ -1,13 +1,85 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from cachetools import TTLCache
 from fastapi import Depends
 from sqlalchemy.orm import Session
 
-from crud.user_crud import ensure_single_user
+from crud.user_crud import ensure_single_user, get_first_active_user_summary
 from database import get_db
 from models import User
 
 
+@dataclass(frozen=True)
+class CachedUser:
+    """当前用户的只读快照，与ORM会话解耦（同 tag_crud.CachedTag）"""
+
+    id: int
+    username: str
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+# 单用户模式下用户行几乎不变，但每个认证请求都查一次库；
+# 短TTL缓存把这次往返从所有热路径上拿掉
+_current_user_cache: TTLCache = TTLCache(maxsize=1, ttl=300)
+_current_user_cache_lock = threading.Lock()
+_CURRENT_USER_KEY = "current_user"
+
+
+def invalidate_current_user_cache() -> None:
+    """用户信息发生变更时使缓存失效"""
+    with _current_user_cache_lock:
+        _current_user_cache.pop(_CURRENT_USER_KEY, None)
+
+
+def _load_and_cache_user(db: Session) -> CachedUser:
+    """缓存未命中时从数据库加载用户快照并写回缓存"""
+    # 先走只取所需列的投影查询；用户还不存在时才退回完整引导路径
+    user = get_first_active_user_summary(db)
+    if user is None:
+        user = ensure_single_user(db)
+    snapshot = CachedUser(
+        id=user.id,
+        username=user.username,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+    )
+
+    with _current_user_cache_lock:
+        _current_user_cache[_CURRENT_USER_KEY] = snapshot
+
+    return snapshot
+
+
 def get_current_user(
     db: Session = Depends(get_db),
 ) -> User:
-    """获取本地单用户模式下的默认用户。"""
-    return ensure_single_user(db)
+    """获取本地单用户模式下的默认用户（带5分钟TTL缓存）。
+
+    返回只读快照对象；下游只读取 id/username/时间戳 字段。
+    """
+    with _current_user_cache_lock:
+        cached = _current_user_cache.get(_CURRENT_USER_KEY)
+    if cached is not None:
+        return cached
+
+    return _load_and_cache_user(db)
+
+
+def load_current_user() -> CachedUser:
+    """不依赖FastAPI注入的用户获取入口，供纯ASGI快速路径使用。
+
+    命中缓存时零DB开销；未命中（至多每个TTL周期一次）自建会话加载。
+    """
+    with _current_user_cache_lock:
+        cached = _current_user_cache.get(_CURRENT_USER_KEY)
+    if cached is not None:
+        return cached
+
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        return _load_and_cache_user(db)
@@ -0,0 +1,24 @@
+"""按路径选择性启用gzip压缩的ASGI包装"""
+
+from starlette.middleware.gzip import GZipMiddleware
+
+
+class SelectiveGZip:
+    """对普通JSON响应启用gzip，对SSE流式路径直接透传
+
+    资源列表携带digest全文，整页JSON很容易到几十KB，gzip通常有
+    5-10倍压缩比；但SSE依赖逐块即时送达，压缩缓冲会破坏流式体验，
+    因此 /ai/chat 前缀的请求绕过压缩。
+    """
+
+    def __init__(self, app, exclude_prefix: str = "/ai/chat"):
+        self.app = app
+        self.exclude_prefix = exclude_prefix
+        # compresslevel=5 是压缩比与CPU开销的平衡点（默认9收益递减）
+        self.gzip_app = GZipMiddleware(app, minimum_size=1024, compresslevel=5)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+        await self.gzip_app(scope, receive, send)
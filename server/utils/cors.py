@@ -0,0 +1,56 @@
+"""轻量级纯ASGI CORS中间件"""
+
+_PREFLIGHT_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"*"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-max-age", b"600"),
+]
+
+_ALLOW_ORIGIN_HEADER = (b"access-control-allow-origin", b"*")
+
+
+class CORSLite:
+    """通配符CORS的极简纯ASGI实现
+
+    本应用始终放行所有来源，不需要 CORSMiddleware 对每个请求做
+    origin 解析与响应头重组：预检请求直接应答204，普通响应只在
+    http.response.start 消息上追加一个 allow-origin 头。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and any(
+            name == b"access-control-request-method"
+            for name, _ in scope["headers"]
+        ):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 204,
+                    "headers": list(_PREFLIGHT_HEADERS),
+                }
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                # 部分端点（如SSE）已自带allow-origin头，重复追加会产生
+                # 多个值，浏览器会直接拒绝这种响应
+                if not any(
+                    name.lower() == b"access-control-allow-origin"
+                    for name, _ in headers
+                ):
+                    headers.append(_ALLOW_ORIGIN_HEADER)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
@@ -1,20 +1,145 @@
 """LangChain 工具定义"""
 import asyncio
+import hashlib
 import json
+import logging
+import threading
 import time
 from typing import Any, Callable, Dict, Optional, Type, List
 
+from cachetools import TTLCache
+
 from langchain_core.tools import BaseTool
 from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+from config import settings
 from crud import resource_crud, tag_crud
+from database import SessionLocal
 from models import Resource, User
 from errors import BusinessError
 from utils.ai_client import create_chat_model
-from utils.web_scraper import fetch_web_content_to_markdown
+from utils.singleflight import singleflight
+from utils.web_scraper import afetch_web_content_to_markdown
+
+logger = logging.getLogger(__name__)
+
+# 并发上限：限制同时在途的LLM请求数，避免并发工具调用触发限流
+_llm_semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+
+# 网页内容送入LLM前的token预算。计费和上下文上限都按token算，
+# 按字符截断对中英文极不均匀（1万字符中文≈1万token，英文≈2500token）
+_WEB_CONTENT_TOKEN_BUDGET = 6000
+
+# token编码器延迟初始化：首次使用可能需要加载编码表，失败时整个
+# 进程退回字符截断，而不是反复重试
+_token_encoder = None
+_token_encoder_unavailable = False
+
+
+def _truncate_web_content(text: str, budget: int = _WEB_CONTENT_TOKEN_BUDGET) -> str:
+    """把网页内容截断到token预算内（编码器不可用时退回字符截断）"""
+    global _token_encoder, _token_encoder_unavailable
+
+    if _token_encoder is None and not _token_encoder_unavailable:
+        try:
+            import tiktoken
+
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("tiktoken编码器不可用，退回字符截断: %s", e)
+            _token_encoder_unavailable = True
+
+    if _token_encoder is None:
+        return text[:10000] + "..." if len(text) > 10000 else text
+
+    tokens = _token_encoder.encode(text)
+    if len(tokens) <= budget:
+        return text
+    return _token_encoder.decode(tokens[:budget])
+
+# AI选择结果缓存：短时间内的相同查询直接复用，省掉整次LLM往返。
+# 键覆盖查询和候选集合，任一变化都会落到新条目（精确匹配）
+_selection_cache: TTLCache = TTLCache(maxsize=256, ttl=600)
+_selection_cache_lock = threading.Lock()
+
+
+def _selection_cache_key(
+    kind: str, user_id: int, query: str, parts: List[str]
+) -> str:
+    """构建选择结果的缓存键（kind区分标签/资源两类选择）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(kind.encode("utf-8"))
+    digest.update(str(user_id).encode("utf-8"))
+    digest.update(query.strip().lower().encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x00")
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _selection_cache_get(key: str) -> Optional[list]:
+    with _selection_cache_lock:
+        cached = _selection_cache.get(key)
+    # 返回副本，调用方的后续修改不会污染缓存
+    return list(cached) if cached is not None else None
+
+
+def _selection_cache_put(key: str, value: list) -> None:
+    with _selection_cache_lock:
+        _selection_cache[key] = list(value)
+
+
+# 送入资源精选LLM的候选上限：提示词长度（也即token与延迟）随候选数
+# 线性增长，粗排到top-K后再交给LLM
+_RESOURCE_CANDIDATE_TOP_K = 30
+
+
+def _keyword_overlap_score(query_lower: str, title_lower: str) -> int:
+    """查询与标题的轻量重合度打分（无分词依赖）
+
+    空格切出的词整词命中计2分；中文查询通常没有空格，
+    补一层字符双连的粗匹配各计1分。
+    """
+    score = 0
+    for term in query_lower.split():
+        if term and term in title_lower:
+            score += 2
+    for i in range(len(query_lower) - 1):
+        bigram = query_lower[i : i + 2]
+        if bigram.strip() and bigram in title_lower:
+            score += 1
+    return score
+
+
+def _prefilter_candidates(
+    user_query: str,
+    resource_candidates: List[Dict],
+    top_k: int = _RESOURCE_CANDIDATE_TOP_K,
+) -> List[Dict]:
+    """按关键词重合度粗排，只保留top-K候选
+
+    稳定排序：同分候选维持原有的 created_at 倒序。
+    """
+    query_lower = user_query.strip().lower()
+    return sorted(
+        resource_candidates,
+        key=lambda r: _keyword_overlap_score(query_lower, r["title"].lower()),
+        reverse=True,
+    )[:top_k]
+
+
+def _load_user_tag_names(user_id: int) -> List[str]:
+    """在工作线程中读取用户标签名列表
+
+    Session 不是线程安全的，这里用独立的短会话；只取已加载的
+    name 列，会话关闭后仍可读。
+    """
+    with SessionLocal() as task_db:
+        return [tag.name for tag in tag_crud.get_user_tags(task_db, user_id)]
+
 
 class TagSelectionOutput(BaseModel):
     """AI标签选择输出模型"""
@@ -52,33 +177,163 @@ class SearchQuery(BaseModel):
     limit: int = Field(default=10, description="返回结果数量限制")
 
 
+# 解析器与提示模板都是纯静态结构，在模块加载时构建一次即可
+# （含format_instructions字符串装配）；LLM随用户配置按请求创建，
+# 链在调用点由 模板 | LLM | 解析器 组合
+_tag_selection_parser = JsonOutputParser(pydantic_object=TagSelectionOutput)
+_tag_selection_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """用户有一个链接资源收藏夹，每个资源有多个标签，用户会告诉你他想要什么样的资源，你需要从给定的标签列表中选择几个最相关的标签。
+<选择原则>
+1. 选择与用户需求直接相关的标签
+2. 最多选择3-5个标签（避免结果过多）
+3. 如果用户需求模糊，选择最可能匹配的标签
+4. 如果没有相关标签，返回空列表
+</选择原则>
+{format_instructions}""",
+    ),
+    (
+        "human",
+        "<用户输入>{user_query}</用户输入>\n<可用标签>{available_tags}</可用标签>\n，请选择相关标签。",
+    ),
+]).partial(format_instructions=_tag_selection_parser.get_format_instructions())
+
+_resource_selection_parser = JsonOutputParser(pydantic_object=ResourceSelectionOutput)
+_resource_selection_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """你是一个智能资源选择助手，用户有一个链接资源收藏夹，现在用户想要找某个或者某些资源，你需要从候选资源列表中选择最匹配的资源。
+<选择原则>
+1. 资源标题要与用户需求相关
+2. 优先选择更具体、更准确匹配的资源
+3. 最多选择5个资源（避免信息过载）
+4. 如果没有相关资源，返回空列表
+</选择原则>
+{format_instructions}""",
+    ),
+    (
+        "human",
+        "<用户输入>{user_query}</用户输入>\n<候选资源>{resources_text}</候选资源>\n请选择最匹配的资源ID：",
+    ),
+]).partial(format_instructions=_resource_selection_parser.get_format_instructions())
+
+_preview_parser = PydanticOutputParser(pydantic_object=ResourceSummary)
+_preview_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="""
+你是一个网页内容提取总结专家，用户觉得一个网页链接的内容很好，想要收藏，你需要根据网页内容和用户的备注，提炼出网页内容的标题，摘要，以及3-5个标签(要求精简凝练)。
+
+重要指导原则：
+1. 网页内容是从链接中爬取的文本内容，可能会混杂很多广告，推荐等等无效信息，请你甄别明晰，找出链接真正的主要的内容。
+2. 如果用户提供了已有标签列表，请优先考虑使用用户已有的标签，这样可以保持用户的标签分类习惯的一致性。
+3. 你可以从用户已有标签中选择合适的标签，也可以生成新的标签，但要确保标签能准确反映内容特征。
+4. 标签应该简洁明了，避免过于宽泛或过于具体。
+5. 如果内容与用户已有标签高度匹配，优先使用已有标签；如果内容有新的特征，可以生成新标签。
+"""
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="""
+<网页内容>{web_content}</网页内容>
+<用户备注>{user_note}</用户备注>
+<用户已有标签>{tags_reference}</用户已有标签>
+<输出要求>{format_instructions}</输出要求>
+""",
+        input_variables=["web_content", "user_note", "tags_reference"],
+        partial_variables={
+            "format_instructions": _preview_parser.get_format_instructions()
+        },
+    ),
+])
+
+
 class StreamingTool(BaseTool):
     """支持流式输出的工具基类"""
     progress_callback: Optional[Callable] = None
-    
+    progress_queue: Optional[Any] = None
+    progress_consumer: Optional[Any] = None
+
     class Config:
         """Pydantic配置"""
         arbitrary_types_allowed = True
-    
+
+    def start_progress_stream(self) -> None:
+        """启动进度消费任务
+
+        emit侧只入队不等待回调，慢的SSE客户端不再拖住搜索主流程。
+        没有运行中的事件循环（同步调用场景）时保持直发模式。
+        """
+        if self.progress_callback is None or self.progress_consumer is not None:
+            return
+        try:
+            self.progress_queue = asyncio.Queue(maxsize=64)
+            self.progress_consumer = asyncio.create_task(self._consume_progress())
+        except RuntimeError:
+            self.progress_queue = None
+            self.progress_consumer = None
+
+    async def _consume_progress(self) -> None:
+        """后台消费进度队列，逐条转交给回调（None哨兵表示收尾）"""
+        while True:
+            payload = await self.progress_queue.get()
+            if payload is None:
+                break
+            try:
+                await self.progress_callback(payload)
+            except Exception as e:
+                logger.warning("进度回调失败: %s", e)
+
+    async def aclose_progress_stream(self) -> None:
+        """冲刷剩余进度并结束消费任务（请求收尾时调用）"""
+        if self.progress_consumer is None:
+            return
+        await self.progress_queue.put(None)
+        await self.progress_consumer
+        self.progress_consumer = None
+        self.progress_queue = None
+
     async def emit_progress(self, step: str, message: str, progress: int = None, data: Any = None):
         """发送进度信息"""
-        print(f"[SearchResourcesTool] Emitting progress: step={step}, message={message}")
-        if self.progress_callback:
-            await self.progress_callback({
-                "type": "tool_progress",
-                "tool_name": self.name,
-                "step": step,
-                "message": message,
-                "progress": progress,
-                "data": data,
-                "timestamp": time.time()
-            })
-        else:
-            print(f"[SearchResourcesTool] No progress_callback set!")
+        logger.debug("[%s] 发送进度: step=%s, message=%s", self.name, step, message)
+        payload = {
+            "type": "tool_progress",
+            "tool_name": self.name,
+            "step": step,
+            "message": message,
+            "progress": progress,
+            "data": data,
+            "timestamp": time.time()
+        }
+        if self.progress_callback is None and self.progress_queue is None:
+            logger.debug("[%s] 未设置progress_callback，跳过进度上报", self.name)
+            return
+        await self._dispatch_event(payload)
+
+    async def _dispatch_event(self, payload: Dict[str, Any]) -> None:
+        """投递事件：有消费任务时入队（不等待），否则直发回调"""
+        if self.progress_queue is not None:
+            # 队列满说明下游消费跟不上：丢最旧的事件给新事件腾位，
+            # 保证有界内存且投递永不阻塞
+            while True:
+                try:
+                    self.progress_queue.put_nowait(payload)
+                    break
+                except asyncio.QueueFull:
+                    try:
+                        self.progress_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        pass
+        elif self.progress_callback:
+            await self.progress_callback(payload)
     
     def _run(self, *args, **kwargs):
-        """同步运行（不推荐使用）"""
-        return asyncio.run(self._arun(*args, **kwargs))
+        """同步入口不受支持
+
+        asyncio.run 每次调用都会新建事件循环：在已运行的循环里
+        直接报错，在执行器线程里则绕开进程级连接池与信号量。
+        工具只在异步Agent中使用，统一走 arun/_arun。
+        """
+        raise NotImplementedError("请使用 arun/_arun，本工具仅支持异步调用")
 
     def build_llm(self):
         """根据当前用户配置创建非流式 LLM。"""
@@ -108,12 +363,13 @@ class SearchResourcesTool(StreamingTool):
             # 步骤1：获取用户所有标签
             await self.emit_progress("analyzing", "🔍 正在分析您的搜索需求...", 10)
             
-            print(f"[步骤1] 获取用户 {self.user_id} 的所有标签...")
-            user_tags = tag_crud.get_user_tags(self.db, self.user_id)
-            
-            if not user_tags:
+            logger.debug("[步骤1] 获取用户 %s 的所有标签...", self.user_id)
+            # DB往返放到工作线程执行，事件循环继续推进其他工具调用
+            tag_names = await asyncio.to_thread(_load_user_tag_names, self.user_id)
+
+            if not tag_names:
                 await self.emit_progress("warning", "⚠️ 您还没有收藏任何资源，请先添加一些资源到您的收藏夹", 100)
-                print("用户暂无任何标签")
+                logger.debug("用户暂无任何标签")
                 return json.dumps({
                     "success": True,
                     "query": query,
@@ -121,19 +377,23 @@ class SearchResourcesTool(StreamingTool):
                     "message": "您还没有收藏任何资源，请先添加一些资源到您的收藏夹"
                 }, ensure_ascii=False)
             
-            tag_names = [tag.name for tag in user_tags]
-            print(f"用户标签: {tag_names}")
+            logger.debug("用户标签: %s", tag_names)
             
             # 步骤2：AI分析用户意图，选出相关标签
             await self.emit_progress("intent", "🤖 AI正在分析您的搜索意图...", 20)
             
-            print(f"[步骤2] AI分析用户意图: '{query}'")
-            selected_tags = await self._select_relevant_tags(query, tag_names)
-            print(f"AI选择的相关标签: {selected_tags}")
+            logger.debug("[步骤2] AI分析用户意图: %r", query)
+            # LLM往返是关键路径上最慢的一段，把候选资源的批量预取
+            # 压到它下面并行执行，DB耗时被完全隐藏
+            selected_tags, all_resources = await asyncio.gather(
+                self._select_relevant_tags(query, tag_names),
+                asyncio.to_thread(self._fetch_user_resources),
+            )
+            logger.debug("AI选择的相关标签: %s", selected_tags)
             
             if not selected_tags:
                 await self.emit_progress("warning", "⚠️ 未找到与您的搜索相关的标签，请尝试使用不同的关键词", 100)
-                print("AI未找到相关标签")
+                logger.debug("AI未找到相关标签")
                 return json.dumps({
                     "success": True,
                     "query": query,
@@ -143,49 +403,30 @@ class SearchResourcesTool(StreamingTool):
             
             await self.emit_progress("tags", f"🏷️ 找到相关标签：{', '.join(selected_tags)}", 30)
             
-            # 步骤3：获取选中标签下的所有资源标题和ID
+            # 步骤3：从预取结果中筛选选中标签下的资源
             await self.emit_progress("searching", "📚 正在搜索相关资源...", 40)
-            
-            print(f"[步骤3] 获取标签下的资源...")
+
+            logger.debug("[步骤3] 筛选标签下的资源...")
             resource_candidates = []
             resource_cache = {}  # 缓存资源对象，避免步骤5重复查询
-            
-            for tag_name in selected_tags:
-                # 获取该标签下的资源
-                try:
-                    resources_data, total_count = resource_crud.get_resources_by_tag(
-                        self.db,
-                        self.user_id,
-                        tag_name,
-                        page=1,
-                        size=100,  # 获取足够多的资源
-                    )
-                    
-                    if resources_data is None:
-                        print(f"警告：标签 '{tag_name}' 返回了None结果")
-                        continue
-                    
-                    print(f"标签 '{tag_name}' 下找到 {len(resources_data)} 个资源")
-                    
-                except Exception as e:
-                    print(f"获取标签 '{tag_name}' 下的资源失败: {str(e)}")
+            selected_tag_set = set(selected_tags)
+
+            # 预取已带回全量资源（单条查询、天然无重复），
+            # 标签交集过滤在Python侧完成
+            for resource in all_resources:
+                if not selected_tag_set & {tag.name for tag in resource.tags}:
                     continue
-                
-                for item in resources_data:
-                    resource = item["resource"]
-                    # 避免重复资源
-                    if not any(r["id"] == resource.id for r in resource_candidates):
-                        resource_candidates.append(
-                            {"id": resource.id, "title": resource.title}
-                        )
-                        # 缓存完整的资源对象
-                        resource_cache[resource.id] = resource
-            
-            print(f"候选资源数量: {len(resource_candidates)}")
+                resource_candidates.append(
+                    {"id": resource.id, "title": resource.title}
+                )
+                # 缓存完整的资源对象
+                resource_cache[resource.id] = resource
+
+            logger.debug("候选资源数量: %d", len(resource_candidates))
             
             if not resource_candidates:
                 await self.emit_progress("warning", "⚠️ 在相关标签下未找到任何资源", 100)
-                print("所选标签下无资源")
+                logger.debug("所选标签下无资源")
                 return json.dumps({
                     "success": True,
                     "query": query,
@@ -196,13 +437,18 @@ class SearchResourcesTool(StreamingTool):
             await self.emit_progress("candidates", f"📊 找到 {len(resource_candidates)} 个候选资源，AI正在筛选最匹配的资源...", 60)
             
             # 步骤4：AI从资源列表中选出匹配的资源ID
-            print(f"[步骤4] AI从 {len(resource_candidates)} 个候选资源中选择匹配项")
-            selected_resource_ids = await self._select_matching_resources(query, resource_candidates)
-            print(f"AI选择的资源ID: {selected_resource_ids}")
+            # 候选数不超过精选上限时，"最多选5个"必然是全选，省掉一次LLM往返
+            if len(resource_candidates) <= 5:
+                logger.debug("[步骤4] 候选仅 %d 个，跳过AI精选直接全选", len(resource_candidates))
+                selected_resource_ids = [r["id"] for r in resource_candidates]
+            else:
+                logger.debug("[步骤4] AI从 %d 个候选资源中选择匹配项", len(resource_candidates))
+                selected_resource_ids = await self._select_matching_resources(query, resource_candidates)
+            logger.debug("AI选择的资源ID: %s", selected_resource_ids)
             
             if not selected_resource_ids:
                 await self.emit_progress("warning", "⚠️ AI未找到与您的需求匹配的资源", 100)
-                print("AI未找到匹配的资源")
+                logger.debug("AI未找到匹配的资源")
                 return json.dumps({
                     "success": True,
                     "query": query,
@@ -211,9 +457,17 @@ class SearchResourcesTool(StreamingTool):
                 }, ensure_ascii=False)
             
             await self.emit_progress("selecting", f"✨ AI选出了 {len(selected_resource_ids)} 个最匹配的资源", 80)
-            
+
+            # 精选完成后裁剪缓存：后续只用到选中的≤限定条数，
+            # 没必要让几百个ORM对象在剩余流程里继续占着堆内存
+            resource_cache = {
+                rid: resource_cache[rid]
+                for rid in selected_resource_ids
+                if rid in resource_cache
+            }
+
             # 步骤5：根据ID查询完整资源信息（使用缓存）
-            print(f"[步骤5] 从缓存中获取完整资源信息")
+            logger.debug("[步骤5] 从缓存中获取完整资源信息")
             final_results = []
             
             for resource_id in selected_resource_ids:
@@ -222,12 +476,14 @@ class SearchResourcesTool(StreamingTool):
                     final_results.append(resource_cache[resource_id])
                 else:
                     # 如果缓存中没有（理论上不应该发生），则查询数据库
-                    print(f"警告：资源ID {resource_id} 不在缓存中，执行数据库查询")
-                    resource = resource_crud.get_resource_by_id(self.db, resource_id, self.user_id)
+                    logger.warning("资源ID %s 不在缓存中，执行数据库查询", resource_id)
+                    resource = await asyncio.to_thread(
+                        self._load_resource_by_id, resource_id
+                    )
                     if resource:
                         final_results.append(resource)
             
-            print(f"工作流完成，返回 {len(final_results)} 个匹配资源")
+            logger.debug("工作流完成，返回 %d 个匹配资源", len(final_results))
             
             # 发送资源数据到前端（新增：通过SSE发送资源卡片）
             if final_results and self.progress_callback:
@@ -239,14 +495,15 @@ class SearchResourcesTool(StreamingTool):
                         "title": resource.title,
                         "url": resource.url,
                         "digest": resource.digest,  # 使用正确的字段名 digest
-                        "tags": [],  # 标签需要额外查询，暂时为空
+                        # 预取已批量加载标签，直接取名即可，无额外查询
+                        "tags": [tag.name for tag in resource.tags],
                         "created_at": resource.created_at.isoformat() if resource.created_at else None,
                     }
                     resources_data.append(resource_dict)
                 
-                # 发送资源数据事件
-                print(f"[SearchResourcesTool] Sending resource event with {len(resources_data)} resources")
-                await self.progress_callback({
+                # 发送资源数据事件（与进度走同一投递路径，保持事件有序）
+                logger.debug("[%s] 发送资源事件，共 %d 个资源", self.name, len(resources_data))
+                await self._dispatch_event({
                     "type": "resource",
                     "resources": resources_data,
                     "count": len(resources_data),
@@ -291,45 +548,55 @@ class SearchResourcesTool(StreamingTool):
                 "query": query
             }, ensure_ascii=False)
     
+    def _load_resource_by_id(self, resource_id: int) -> Optional[Resource]:
+        """在工作线程中按ID补查单个资源（缓存未命中的兜底路径）"""
+        with SessionLocal() as task_db:
+            # tags 是 lazy="raise"，必须走 selectinload 预加载版本，
+            # 否则后续序列化标签名会直接抛 InvalidRequestError
+            return resource_crud.get_resource_with_tags_by_id(
+                task_db, resource_id, self.user_id
+            )
+
+    def _fetch_user_resources(self) -> List[Resource]:
+        """在工作线程中预取用户全部资源
+
+        Session 不是线程安全的，这里用独立的短会话；标签和列
+        均已批量加载，会话关闭后对象仍可读。
+        """
+        with SessionLocal() as task_db:
+            return resource_crud.get_user_resources_with_tags(task_db, self.user_id)
+
     async def _select_relevant_tags(self, user_query: str, available_tags: List[str]) -> List[str]:
         """AI选择与用户查询相关的标签"""
         if not available_tags:
             return []
-        
-        # 设置JSON输出解析器（使用Pydantic模型）
-        parser = JsonOutputParser(pydantic_object=TagSelectionOutput)
-        
-        # 创建提示模板（使用partial_variables设置format_instructions）
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """用户有一个链接资源收藏夹，每个资源有多个标签，用户会告诉你他想要什么样的资源，你需要从给定的标签列表中选择几个最相关的标签。
-<选择原则>
-1. 选择与用户需求直接相关的标签
-2. 最多选择3-5个标签（避免结果过多）
-3. 如果用户需求模糊，选择最可能匹配的标签
-4. 如果没有相关标签，返回空列表
-</选择原则>
-{format_instructions}""",
-            ),
-            (
-                "human",
-                "<用户输入>{user_query}</用户输入>\n<可用标签>{available_tags}</可用标签>\n，请选择相关标签。",
-            ),
-        ]).partial(format_instructions=parser.get_format_instructions())
-        
-        # 构建链
-        chain = prompt | self.build_llm() | parser
+
+        # 标签总数不超过"最多选3-5个"的上限时，LLM不可能给出更小的
+        # 有效子集，直接全选，省掉整次LLM往返
+        if len(available_tags) <= 5:
+            logger.debug("标签仅 %d 个，跳过AI选择直接全选", len(available_tags))
+            return list(available_tags)
+
+        cache_key = _selection_cache_key(
+            "tags", self.user_id, user_query, sorted(available_tags)
+        )
+        cached = _selection_cache_get(cache_key)
+        if cached is not None:
+            logger.debug("标签选择命中缓存: %s", cached)
+            return cached
+
+        # 构建链（模板与解析器复用模块级单例）
+        chain = _tag_selection_prompt | self.build_llm() | _tag_selection_parser
         
         try:
-            # 使用 asyncio.run_in_executor 将同步调用转为异步
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, chain.invoke, {
-                "user_query": user_query,
-                "available_tags": available_tags,
-            })
-            
-            print(f"AI返回结果类型: {type(result)}, 值: {result}")
+            # 原生异步调用：走共享异步HTTP客户端，不占用线程池
+            async with _llm_semaphore:
+                result = await chain.ainvoke({
+                    "user_query": user_query,
+                    "available_tags": available_tags,
+                })
+
+            logger.debug("AI返回结果类型: %s, 值: %s", type(result), result)
             
             # 处理不同类型的返回结果
             if isinstance(result, dict):
@@ -337,17 +604,19 @@ class SearchResourcesTool(StreamingTool):
             elif hasattr(result, "selected_tags"):
                 selected_tags = result.selected_tags
             else:
-                print(f"意外的结果类型: {type(result)}, 值: {result}")
+                logger.warning("意外的结果类型: %s, 值: %s", type(result), result)
                 selected_tags = []
             
-            print(f"AI选择的标签（原始）: {selected_tags}")
+            logger.debug("AI选择的标签（原始）: %s", selected_tags)
             
             # 验证选择的标签是否在可用标签中
             valid_tags = [tag for tag in selected_tags if tag in available_tags]
+            # 只缓存LLM成功路径的结果，兜底匹配不写缓存
+            _selection_cache_put(cache_key, valid_tags)
             return valid_tags
             
         except Exception as e:
-            print(f"标签选择失败: {str(e)}")
+            logger.warning("标签选择失败: %s", e)
             # 兜底策略：简单关键词匹配
             user_query_lower = user_query.lower()
             fallback_tags = []
@@ -360,42 +629,43 @@ class SearchResourcesTool(StreamingTool):
         """AI从候选资源中选择最匹配用户需求的资源"""
         if not resource_candidates:
             return []
-        
+
+        # 候选过多时先做轻量粗排：25KB量级的候选清单会让提示词
+        # token与LLM延迟线性膨胀，top-K之后质量几乎无损
+        if len(resource_candidates) > _RESOURCE_CANDIDATE_TOP_K:
+            resource_candidates = _prefilter_candidates(
+                user_query, resource_candidates
+            )
+            logger.debug(
+                "候选过多，关键词粗排后保留 %d 个", len(resource_candidates)
+            )
+
+        cache_key = _selection_cache_key(
+            "resources",
+            self.user_id,
+            user_query,
+            sorted(str(r["id"]) for r in resource_candidates),
+        )
+        cached = _selection_cache_get(cache_key)
+        if cached is not None:
+            logger.debug("资源选择命中缓存: %s", cached)
+            return cached
+
         # 创建资源列表字符串
         resources_text = "\n".join([f"ID: {r['id']}, 标题: {r['title']}" for r in resource_candidates])
         
-        # 设置JSON输出解析器（使用Pydantic模型）
-        parser = JsonOutputParser(pydantic_object=ResourceSelectionOutput)
-        
-        # 创建提示模板（使用partial_variables设置format_instructions）
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """你是一个智能资源选择助手，用户有一个链接资源收藏夹，现在用户想要找某个或者某些资源，你需要从候选资源列表中选择最匹配的资源。
-<选择原则>
-1. 资源标题要与用户需求相关
-2. 优先选择更具体、更准确匹配的资源
-3. 最多选择5个资源（避免信息过载）
-4. 如果没有相关资源，返回空列表
-</选择原则>
-{format_instructions}""",
-            ),
-            (
-                "human",
-                "<用户输入>{user_query}</用户输入>\n<候选资源>{resources_text}</候选资源>\n请选择最匹配的资源ID：",
-            ),
-        ]).partial(format_instructions=parser.get_format_instructions())
-        
-        # 构建链
-        chain = prompt | self.build_llm() | parser
+        # 构建链（模板与解析器复用模块级单例）
+        chain = (
+            _resource_selection_prompt | self.build_llm() | _resource_selection_parser
+        )
         
         try:
-            # 使用 asyncio.run_in_executor 将同步调用转为异步
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, chain.invoke, {
-                "user_query": user_query,
-                "resources_text": resources_text,
-            })
+            # 原生异步调用：走共享异步HTTP客户端，不占用线程池
+            async with _llm_semaphore:
+                result = await chain.ainvoke({
+                    "user_query": user_query,
+                    "resources_text": resources_text,
+                })
             
             # 处理不同类型的返回结果
             if isinstance(result, dict):
@@ -403,7 +673,7 @@ class SearchResourcesTool(StreamingTool):
             elif hasattr(result, "selected_resource_ids"):
                 selected_ids = result.selected_resource_ids
             else:
-                print(f"意外的结果类型: {type(result)}, 值: {result}")
+                logger.warning("意外的结果类型: %s, 值: %s", type(result), result)
                 selected_ids = []
             
             # 验证ID是否存在于候选列表中
@@ -413,11 +683,13 @@ class SearchResourcesTool(StreamingTool):
             for resource_id in selected_ids:
                 if resource_id in candidate_ids:
                     valid_ids.append(resource_id)
-            
+
+            # 只缓存LLM成功路径的结果，兜底匹配不写缓存
+            _selection_cache_put(cache_key, valid_ids)
             return valid_ids
             
         except Exception as e:
-            print(f"资源选择失败: {str(e)}")
+            logger.warning("资源选择失败: %s", e)
             # 兜底策略：基于关键词简单匹配
             user_keywords = user_query.lower().split()
             fallback_ids = []
@@ -450,7 +722,8 @@ class ResourcePreviewTool(StreamingTool):
             await self.emit_progress("fetching", "🌐 正在获取网页内容...", 20)
             
             try:
-                web_content = fetch_web_content_to_markdown(url)
+                # 异步抓取：几十秒的Jina往返不再卡住事件循环
+                web_content = await afetch_web_content_to_markdown(url)
                 if not web_content:
                     await self.emit_progress("error", "❌ 无法获取网页内容", 0)
                     return json.dumps({
@@ -458,10 +731,18 @@ class ResourcePreviewTool(StreamingTool):
                         "error": "无法获取网页内容，请检查URL是否正确"
                     }, ensure_ascii=False)
                 
-                # 限制内容长度
-                if len(web_content) > 10000:
-                    web_content = web_content[:10000] + "..."
-                    
+                # 过短内容基本是抓取失败或跳转页，花一次LLM调用毫无意义
+                if len(web_content.strip()) < 50:
+                    await self.emit_progress("error", "❌ 网页内容过短，无法生成预览", 0)
+                    return json.dumps({
+                        "success": False,
+                        "error": "网页内容过短，无法生成预览，请检查URL是否正确"
+                    }, ensure_ascii=False)
+
+                # 按token预算截断，中英文内容的提示词开销一致可控
+                web_content = _truncate_web_content(web_content)
+
+
             except Exception as e:
                 await self.emit_progress("error", f"❌ 获取网页内容失败: {str(e)}", 0)
                 return json.dumps({
@@ -471,60 +752,38 @@ class ResourcePreviewTool(StreamingTool):
             
             await self.emit_progress("analyzing", "📝 正在分析网页内容...", 40)
             
-            # 步骤2：获取用户已有标签
-            user_tags = tag_crud.get_user_tags(self.db, self.user_id)
-            user_tag_names = [tag.name for tag in user_tags] if user_tags else []
+            # 步骤2：获取用户已有标签（工作线程中执行，不阻塞事件循环）
+            user_tag_names = await asyncio.to_thread(
+                _load_user_tag_names, self.user_id
+            )
             
             await self.emit_progress("generating", "🤖 AI正在生成资源预览...", 60)
             
             # 步骤3：使用AI生成资源摘要
             try:
-                # 构建Pydantic解析器
-                parser = PydanticOutputParser(pydantic_object=ResourceSummary)
-                
                 # 构建标签参考信息
                 tags_reference = ""
                 if user_tag_names:
                     tags_reference = f"\n<用户已有标签>{', '.join(user_tag_names)}</用户已有标签>"
-                
-                # 创建提示模板
-                prompt = ChatPromptTemplate.from_messages([
-                    SystemMessagePromptTemplate.from_template(
-                        template="""
-你是一个网页内容提取总结专家，用户觉得一个网页链接的内容很好，想要收藏，你需要根据网页内容和用户的备注，提炼出网页内容的标题，摘要，以及3-5个标签(要求精简凝练)。
 
-重要指导原则：
-1. 网页内容是从链接中爬取的文本内容，可能会混杂很多广告，推荐等等无效信息，请你甄别明晰，找出链接真正的主要的内容。
-2. 如果用户提供了已有标签列表，请优先考虑使用用户已有的标签，这样可以保持用户的标签分类习惯的一致性。
-3. 你可以从用户已有标签中选择合适的标签，也可以生成新的标签，但要确保标签能准确反映内容特征。
-4. 标签应该简洁明了，避免过于宽泛或过于具体。
-5. 如果内容与用户已有标签高度匹配，优先使用已有标签；如果内容有新的特征，可以生成新标签。
-"""
-                    ),
-                    HumanMessagePromptTemplate.from_template(
-                        template="""
-<网页内容>{web_content}</网页内容>
-<用户备注>{user_note}</用户备注>
-<用户已有标签>{tags_reference}</用户已有标签>
-<输出要求>{format_instructions}</输出要求>
-""",
-                        input_variables=["web_content", "user_note", "tags_reference"],
-                        partial_variables={
-                            "format_instructions": parser.get_format_instructions()
-                        },
-                    ),
-                ])
-                
-                # 创建链并执行
-                chain = prompt | self.build_llm() | parser
+                # 创建链并执行（模板与解析器复用模块级单例）
+                chain = _preview_prompt | self.build_llm() | _preview_parser
                 
-                # 使用asyncio.run_in_executor执行同步调用
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(None, chain.invoke, {
-                    "web_content": web_content,
-                    "user_note": note,
-                    "tags_reference": tags_reference,
-                })
+                # 原生异步调用：走共享异步HTTP客户端，不占用线程池。
+                # 并发的相同(URL,备注)预览合并为一次LLM调用
+                preview_key = "preview:" + hashlib.blake2b(
+                    f"{url}\x00{note}".encode("utf-8"), digest_size=16
+                ).hexdigest()
+
+                async def _invoke_preview_chain():
+                    async with _llm_semaphore:
+                        return await chain.ainvoke({
+                            "web_content": web_content,
+                            "user_note": note,
+                            "tags_reference": tags_reference,
+                        })
+
+                result = await singleflight(preview_key, _invoke_preview_chain)
                 
                 await self.emit_progress("completed", "✅ 资源预览生成完成！", 100)
                 
@@ -564,8 +823,8 @@ class CreateResourceTool(BaseTool):
     db: Optional[Session] = None
     
     def _run(self, url: str, title: str, tags: List[str], digest: str) -> str:
-        """同步执行（转发到异步方法）"""
-        return asyncio.run(self._arun(url, title, tags, digest))
+        """同步入口不受支持（原因见 StreamingTool._run）"""
+        raise NotImplementedError("请使用 arun/_arun，本工具仅支持异步调用")
     
     async def _arun(self, url: str, title: str, tags: List[str], digest: str) -> str:
         """异步执行创建资源"""
@@ -573,15 +832,19 @@ class CreateResourceTool(BaseTool):
             if not self.user_id or not self.db:
                 raise ValueError("工具未正确初始化：缺少 user_id 或 db")
             
-            # 创建资源
-            resource = resource_crud.create_resource(
-                db=self.db,
-                url=url,
-                title=title,
-                digest=digest,
-                tags=tags,
-                user_id=self.user_id
-            )
+            # 创建资源（写事务放到工作线程，用独立会话执行）
+            def _create() -> Optional[Resource]:
+                with SessionLocal() as task_db:
+                    return resource_crud.create_resource(
+                        db=task_db,
+                        url=url,
+                        title=title,
+                        digest=digest,
+                        tags=tags,
+                        user_id=self.user_id,
+                    )
+
+            resource = await asyncio.to_thread(_create)
             
             if resource:
                 return json.dumps({
@@ -619,14 +882,16 @@ def get_tools(progress_callback: Optional[Callable] = None, user_id: Optional[in
     search_tool.db = db
     if progress_callback:
         search_tool.progress_callback = progress_callback
+        search_tool.start_progress_stream()
     tools.append(search_tool)
-    
+
     # 创建资源预览工具
     preview_tool = ResourcePreviewTool()
     preview_tool.user_id = user_id
     preview_tool.db = db
     if progress_callback:
         preview_tool.progress_callback = progress_callback
+        preview_tool.start_progress_stream()
     tools.append(preview_tool)
     
     # 创建资源工具
@@ -0,0 +1,40 @@
+"""进程内请求合并（singleflight）
+
+并发出现的相同请求只真正执行一次，后到的调用等待第一个调用的
+Future 结果，而不是重复发起网络请求。只在单个事件循环内使用，
+无需加锁。
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+async def singleflight(key: str, coro_factory: Callable[[], Awaitable[T]]) -> T:
+    """按key合并并发的重复调用
+
+    已有同key调用在途时直接等待其结果（shield保护：等待方被取消
+    不会连带取消共享的Future）；否则执行 coro_factory 并把结果/
+    异常广播给所有等待方。
+    """
+    existing = _inflight.get(key)
+    if existing is not None:
+        return await asyncio.shield(existing)
+
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await coro_factory()
+    except BaseException as exc:
+        if not future.cancelled():
+            future.set_exception(exc)
+            future.exception()  # 标记已取出，避免"never retrieved"告警
+        raise
+    else:
+        if not future.cancelled():
+            future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
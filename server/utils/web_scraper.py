@@ -1,24 +1,76 @@
+import asyncio
+import threading
 from urllib.parse import urlparse
 
+import httpx
 import requests
+from cachetools import TTLCache
 from requests import RequestException
 
+from config import settings
 from errors import BusinessError
+from utils.singleflight import singleflight
 
+# Jina 专用的进程级异步连接池：保持TLS长连接，抓取期间不阻塞事件循环
+_jina_async_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(30.0, connect=10.0),
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+)
 
-def fetch_web_content_to_markdown(url: str) -> str:
-    """使用 Jina AI 获取网页内容"""
-    # 验证URL格式
+# 同步抓取路径的连接复用：Session保持到 r.jina.ai 的TLS长连接，
+# 免去每次抓取~100ms量级的握手
+_jina_sync_session = requests.Session()
+
+# 并发上限：同时在途的Jina请求过多会触发限流，信号量排队而非失败
+_jina_semaphore = asyncio.Semaphore(settings.JINA_CONCURRENCY)
+
+# 抓取结果缓存：同一URL反复预览（预览→改备注→再预览）时跳过整次网络往返
+_content_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_content_cache_lock = threading.Lock()
+
+
+def _content_cache_key(url: str) -> str:
+    """缓存键归一化：去掉fragment、主机名转小写"""
+    parsed = urlparse(url)
+    return parsed._replace(netloc=parsed.netloc.lower(), fragment="").geturl()
+
+
+def _content_cache_get(key: str):
+    with _content_cache_lock:
+        return _content_cache.get(key)
+
+
+def _content_cache_put(key: str, content: str) -> None:
+    with _content_cache_lock:
+        _content_cache[key] = content
+
+
+async def close_jina_client() -> None:
+    """应用关闭时释放Jina连接池（在 lifespan 收尾阶段调用）。"""
+    await _jina_async_client.aclose()
+
+
+def _build_jina_url(url: str) -> str:
+    """校验URL并构建 Jina AI 请求地址"""
     parsed_url = urlparse(url)
     if not parsed_url.scheme or not parsed_url.netloc:
         raise BusinessError("无效的URL格式")
 
-    # 构建 Jina AI 请求URL
-    jina_url = f"https://r.jina.ai/{url}"
+    return f"https://r.jina.ai/{url}"
+
+
+def fetch_web_content_to_markdown(url: str) -> str:
+    """使用 Jina AI 获取网页内容"""
+    jina_url = _build_jina_url(url)
+
+    cache_key = _content_cache_key(url)
+    cached = _content_cache_get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
         # 使用更合理的超时设置：(连接超时, 读取超时)
-        response = requests.get(jina_url, timeout=(10, 30))
+        response = _jina_sync_session.get(jina_url, timeout=(10, 30))
         response.raise_for_status()
     except RequestException as e:
         raise BusinessError(f"抓取网页内容失败: {str(e)}") from e
@@ -26,4 +78,57 @@ def fetch_web_content_to_markdown(url: str) -> str:
     if not response.text or not response.text.strip():
         raise BusinessError("抓取网页内容失败: 返回内容为空")
 
+    _content_cache_put(cache_key, response.text)
     return response.text
+
+
+async def afetch_web_content_to_markdown(url: str) -> str:
+    """fetch_web_content_to_markdown 的异步版本
+
+    走共享的 httpx.AsyncClient，几十秒的抓取期间事件循环
+    可以继续推进其他工具调用和LLM流。
+    """
+    jina_url = _build_jina_url(url)
+
+    cache_key = _content_cache_key(url)
+    cached = _content_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # 并发的相同URL抓取合并为一次请求，结果共享
+    return await singleflight(
+        f"jina:{cache_key}", lambda: _afetch_uncached(jina_url, cache_key)
+    )
+
+
+# 流式抓取的字符上限：正文进入LLM前还会按token截断到更小的预算，
+# 超长文章没必要整篇读进内存再扔掉
+_MAX_FETCH_CHARS = 40_000
+
+
+async def _afetch_uncached(jina_url: str, cache_key: str) -> str:
+    """实际执行一次异步Jina抓取并写入缓存
+
+    流式读取响应，达到字符上限即停止，既压低峰值内存
+    也省掉尾部内容的传输时间。
+    """
+    try:
+        async with _jina_semaphore:
+            async with _jina_async_client.stream("GET", jina_url) as response:
+                response.raise_for_status()
+                chunks = []
+                total = 0
+                async for chunk in response.aiter_text(chunk_size=4096):
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total >= _MAX_FETCH_CHARS:
+                        break
+    except httpx.HTTPError as e:
+        raise BusinessError(f"抓取网页内容失败: {str(e)}") from e
+
+    content = "".join(chunks)[:_MAX_FETCH_CHARS]
+    if not content.strip():
+        raise BusinessError("抓取网页内容失败: 返回内容为空")
+
+    _content_cache_put(cache_key, content)
+    return content